@@ -0,0 +1,201 @@
+
+from unittest import TestCase
+
+import myio
+
+
+class Tainted(str):
+    '''
+    A str subclass that keeps, like tstr, the input offset of each
+    character through slicing and +, and counts the characters + copies.
+    '''
+
+    copied = 0
+
+    def __new__(cls, s, taint=None):
+        t = str.__new__(cls, s)
+        t.taint = list(range(len(s))) if taint is None else taint
+        return t
+
+    def __getitem__(self, k):
+        if isinstance(k, int):
+            k = slice(k, k + 1 if k != -1 else None)
+        return Tainted(str.__getitem__(self, k), self.taint[k])
+
+    def __add__(self, other):
+        Tainted.copied += len(self) + len(other)
+        return Tainted(str.__add__(self, other),
+                       self.taint + getattr(other, 'taint', [-1] * len(other)))
+
+    def __radd__(self, other):
+        Tainted.copied += len(self) + len(other)
+        return Tainted(str.__add__(other, self), [-1] * len(other) + self.taint)
+
+
+def line(i):
+    s = 'line %06d: the quick brown fox jumps\n' % i
+    return Tainted(s, [i * 100 + j for j in range(len(s))])
+
+
+class TaintedWriteTest(TestCase):
+
+    def test_taint_survives(self):
+        f = myio.StringIO()
+        lines = [line(i) for i in range(300)]
+        for l in lines:
+            f.write(l)
+        value = f.getvalue()
+        self.assertEqual(value, ''.join(lines))
+        self.assertEqual(value.taint, sum((l.taint for l in lines), []))
+        f.seek(len(lines[0]) * 7)
+        self.assertEqual(f.readline().taint, lines[7].taint)
+        f.seek(len(lines[0]) * 5 + 3)
+        read = f.read(len(lines[0]) * 2)
+        self.assertEqual(read.taint, (lines[5].taint + lines[6].taint + lines[7].taint)[3:3 + len(read)])
+
+    def test_mixed_with_plain(self):
+        f = myio.StringIO()
+        f.write('plain ')
+        f.write(line(1))
+        f.write('x' * myio.CHUNK)
+        value = f.getvalue()
+        self.assertEqual(value.taint[:6], [-1] * 6)
+        self.assertEqual(value.taint[6:6 + len(line(1))], line(1).taint)
+
+    def test_many_writes_stay_near_linear(self):
+        # One chunk per write, rebuilt with a running +, copies O(n^2)
+        # characters; this regressed to 21s for 16000 lines.
+        n = 16000
+        lines = [line(i) for i in range(n)]
+        Tainted.copied = 0
+        f = myio.StringIO()
+        for l in lines:
+            f.write(l)
+        f.getvalue()
+        total = n * len(lines[0])
+        self.assertLess(Tainted.copied, total * 20)
+
+
+class LineIndexTest(TestCase):
+
+    def check_lines(self, f):
+        value = f.getvalue()
+        starts = [0] + [i + 1 for i, c in enumerate(value) if c == '\n']
+        for n, start in enumerate(starts):
+            f.seek_line(n)
+            self.assertEqual(f.tell(), start)
+        f.seek_line(len(starts))
+        self.assertEqual(f.tell(), len(value))
+
+    def test_overwrite_keeps_index(self):
+        f = myio.StringIO('ab\ncd\nef\ngh\n' * 20)
+        self.check_lines(f)
+        f.seek(4)
+        f.write('\nx\n')
+        self.check_lines(f)
+        f.seek(30)
+        f.write('yyyy')
+        self.check_lines(f)
+        f.truncate(50)
+        self.check_lines(f)
+        f.seek(0, 2)
+        f.write('tail\nend')
+        self.check_lines(f)
+
+    def test_readline_after_write(self):
+        f = myio.StringIO('one\ntwo\nthree\nfour\n')
+        f.seek_line(3)
+        f.seek(0)
+        f.write('O\nE')
+        f.seek_line(1)
+        self.assertEqual(f.readline(), 'E\n')
+        self.assertEqual(list(f), ['two\n', 'three\n', 'four\n'])
+
+
+class BytesIOTest(TestCase):
+
+    def test_seek_errors(self):
+        f = myio.BytesIO(b'abc')
+        self.assertRaises(ValueError, f.seek, -1)
+        self.assertRaises(ValueError, f.seek, 0, 5)
+        self.assertEqual(f.seek(-10, 1), 0)
+        self.assertEqual(f.seek(-1, 2), 2)
+
+    def test_truncate_negative(self):
+        f = myio.BytesIO(b'abc')
+        self.assertRaises(ValueError, f.truncate, -1)
+        self.assertEqual(f.getvalue(), b'abc')
+
+    def test_with(self):
+        with myio.BytesIO(b'abc') as f:
+            self.assertEqual(f.read(), b'abc')
+        self.assertTrue(f.closed)
+        self.assertRaises(ValueError, f.__enter__)
+        f = myio.BytesIO(b'abc')
+        view = f.getbuffer()
+        with self.assertRaises(BufferError):
+            with f:
+                pass
+        self.assertFalse(f.closed)
+        view.release()
+
+    def test_none(self):
+        self.assertEqual(myio.BytesIO(None).getvalue(), b'')
+
+    def test_exported_buffer(self):
+        f = myio.BytesIO(b'abc')
+        view = f.getbuffer()
+        part = view[1:]
+        view.release()
+        self.assertRaises(BufferError, f.write, b'x')
+        self.assertRaises(BufferError, f.truncate, 1)
+        self.assertRaises(BufferError, f.close)
+        self.assertEqual(f.read(), b'abc')
+        part.release()
+        self.assertEqual(f.write(b'x'), 1)
+        self.assertEqual(f.getvalue(), b'abcx')
+        f.getbuffer()
+        f.close()
+
+
+class StringViewTest(TestCase):
+
+    def test_shares_base(self):
+        base = line(3)
+        v = myio.StringView(base, 5, 12)
+        self.assertIs(v.base, base)
+        self.assertEqual(len(v), 7)
+        self.assertEqual(v[0], base[5])
+        self.assertEqual(v[-1], base[11])
+        self.assertRaises(IndexError, v.__getitem__, 7)
+        w = v[2:5]
+        self.assertIsInstance(w, myio.StringView)
+        self.assertIs(w.base, base)
+        self.assertEqual((w.start, w.stop), (7, 10))
+        self.assertEqual(myio.StringView(v, 1, 3).start, 6)
+        self.assertIsNone(v.value)
+
+    def test_used_as_string(self):
+        base = line(3)
+        v = myio.StringView(base, 5, 12)
+        self.assertEqual(v, base[5:12])
+        self.assertEqual(hash(v), hash(str.__getitem__(base, slice(5, 12))))
+        self.assertEqual(v.find('0'), 0)
+        self.assertEqual(v.find('x'), -1)
+        self.assertIn('003', v)
+        self.assertEqual(v[::2], base[5:12:2])
+        self.assertEqual(v.split('0'), base[5:12].split('0'))
+        self.assertEqual(v + '!', base[5:12] + '!')
+        self.assertEqual('%s' % v, base[5:12])
+        self.assertEqual(str(v).taint, base.taint[5:12])
+        self.assertEqual((v + '!').taint, base.taint[5:12] + [-1])
+
+    def test_view_reads(self):
+        lines = [line(i) for i in range(3)]
+        f = myio.StringIO(lines[0] + lines[1] + lines[2], view=True)
+        read = f.readline()
+        self.assertIsInstance(read, myio.StringView)
+        self.assertEqual(str(read).taint, lines[0].taint)
+        read = f.read(4)
+        self.assertIsInstance(read, myio.StringView)
+        self.assertEqual(str(read).taint, lines[1].taint[:4])
@@ -1,14 +1,18 @@
 r"""File-like objects that read from or write to a string buffer.
 
+StringIO holds text; BytesIO (at the end of the notes) holds bytes.
+
 This implements (nearly) all stdio methods.
 
 f = StringIO()      # ready for writing
 f = StringIO(buf)   # ready for reading
+f = StringIO(buf, view=True) # reads return StringViews of buf
 f.close()           # explicitly release resources held
 flag = f.isatty()   # always false
 pos = f.tell()      # get current position
 f.seek(pos)         # set current position
 f.seek(pos, mode)   # mode 0: absolute; 1: relative; 2: relative to EOF
+f.seek_line(n)      # set current position to the start of line n
 buf = f.read()      # read until EOF
 buf = f.read(n)     # read up to n bytes
 buf = f.readline()  # read until end of line ('\n') or EOF
@@ -26,38 +30,198 @@ Notes:
   an exception early.
 - Seeking far beyond EOF and then writing will insert real null
   bytes that occupy space in the buffer.
-- There's a simple test set (see end of this file).
+- The contents are kept as a list of chunks with their start offsets, so
+  a write or read at any position only touches the chunks it overlaps.
+  Reads within a chunk are slices of it, and tainted strings are joined
+  with + (pairwise, so a large tainted output stays O(n log n)), which
+  keeps their taint.
+- With view=True, reads that fall within one chunk return a StringView
+  sharing the chunk (and so its taint) instead of a copy. A view becomes
+  a string when str() is called on it or when it is used as one, other
+  than through len(), indexing and slicing. Views are not str instances;
+  only use them with code that doesn't check.
+- seek_line() indexes line starts as far as it needs to, and reads
+  inside the indexed region take line ends from it; past it, they find()
+  the newline in the chunk read last. A write before the end only
+  re-indexes the lines it overwrote, truncate() drops the index past
+  the new end.
+- BytesIO follows io.BytesIO: write() returns the number of bytes
+  written, seek() and truncate() the new position and size. It reads
+  from the bytes object it was made with until the first write, so a
+  tainted bytes subclass keeps its taint in what is read. The first
+  write (or getbuffer()) copies it into a bytearray. getbuffer()
+  returns a memoryview of that bytearray, and readinto() copies
+  straight into a caller's buffer. As in io, write(), truncate() and
+  close() raise BufferError while a getbuffer() view is alive, and a
+  BytesIO is a context manager that closes it.
+- There's a simple test set (see end of this file). pycore/myio_bench.py
+  benchmarks StringIO against io.StringIO and fuzzes them against each
+  other.
 """
+import array
+import bisect
+
 try:
     from errno import EINVAL
 except ImportError:
     EINVAL = 22
 
-__all__ = ["StringIO"]
+__all__ = ["StringIO", "StringView", "BytesIO"]
+
+# Consecutive small writes at the end are joined into chunks of about
+# this size.
+CHUNK = 4096
+# How far ahead of a read the line index is extended at a time.
+SCAN = 1 << 16
 
 def _complain_ifclosed(closed):
     if closed:
         raise ValueError("I/O operation on closed file")
 
+def _concat(pieces):
+    if all(type(p) is str for p in pieces):
+        return ''.join(pieces)
+    # join() would drop the taint of str subclasses; + keeps it. Adding
+    # neighbours pairwise copies each character O(log n) times rather
+    # than O(n).
+    pieces = [_str(p) for p in pieces]
+    while len(pieces) > 1:
+        pieces = [pieces[i] + pieces[i+1] if i + 1 < len(pieces) else pieces[i]
+                  for i in range(0, len(pieces), 2)]
+    return pieces[0] if pieces else ''
+
+def _str(s):
+    return s.materialize() if isinstance(s, StringView) else s
+
+class StringView:
+    """class StringView(base, start, stop)
+
+    A read-only view of base[start:stop], sharing base. It is copied into
+    a string (a slice of base, which keeps taint) the first time it is
+    used as one; len(), indexing and slicing don't copy.
+    """
+    __slots__ = ('base', 'start', 'stop', 'value')
+
+    def __init__(self, base, start=0, stop=None):
+        if stop is None:
+            stop = len(base)
+        if isinstance(base, StringView):
+            base, start, stop = base.base, base.start + start, base.start + stop
+        self.base = base
+        self.start = start
+        self.stop = stop
+        self.value = None
+
+    def materialize(self):
+        if self.value is None:
+            self.value = self.base[self.start:self.stop]
+        return self.value
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, k):
+        n = self.stop - self.start
+        if isinstance(k, slice):
+            lo, hi, step = k.indices(n)
+            if step != 1:
+                return self.materialize()[k]
+            return StringView(self.base, self.start + lo, self.start + max(lo, hi))
+        if k < 0:
+            k += n
+        if not 0 <= k < n:
+            raise IndexError("string index out of range")
+        return self.base[self.start + k]
+
+    def find(self, sub, start=0, end=None):
+        n = self.stop - self.start
+        start, end, _ = slice(start, end).indices(n)
+        i = self.base.find(sub, self.start + start, self.start + end)
+        return i - self.start if i >= 0 else i
+
+    def __str__(self):
+        return self.materialize()
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+    def __eq__(self, other):
+        return self.materialize() == _str(other)
+
+    def __ne__(self, other):
+        return self.materialize() != _str(other)
+
+    def __lt__(self, other):
+        return self.materialize() < _str(other)
+
+    def __le__(self, other):
+        return self.materialize() <= _str(other)
+
+    def __gt__(self, other):
+        return self.materialize() > _str(other)
+
+    def __ge__(self, other):
+        return self.materialize() >= _str(other)
+
+    def __hash__(self):
+        return hash(self.materialize())
+
+    def __contains__(self, sub):
+        return self.find(_str(sub)) >= 0
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __add__(self, other):
+        return self.materialize() + _str(other)
+
+    def __radd__(self, other):
+        return other + self.materialize()
+
+    def __mul__(self, n):
+        return self.materialize() * n
+
+    def __mod__(self, args):
+        return self.materialize() % args
+
+    def __format__(self, spec):
+        return format(self.materialize(), spec)
+
+    def __getattr__(self, name):
+        # Everything else (split, strip, ...) is the string's.
+        return getattr(self.materialize(), name)
+
 class StringIO:
-    """class StringIO([buffer])
+    """class StringIO([buffer[, view]])
 
     When a StringIO object is created, it can be initialized to an existing
     string by passing the string to the constructor. If no string is given,
-    the StringIO will start empty.
+    the StringIO will start empty. Strings, str subclasses and StringViews
+    are used as they are, without a copy. If view is true, reads return
+    StringViews where they can (see the notes above).
 
     The StringIO object can accept either Unicode or 8-bit strings, but
     mixing the two may take some care. If both are used, 8-bit strings that
     cannot be interpreted as 7-bit ASCII (that use the 8th bit) will cause
     a UnicodeError to be raised when getvalue() is called.
     """
-    def __init__(self, buf = ''):
-        # Force self.buf to be a string or unicode
-        if not isinstance(buf, str):
+    def __init__(self, buf = '', view = False):
+        # Force buf to be a string or unicode (or a view of one)
+        if not isinstance(buf, (str, StringView)):
             buf = str(buf)
-        self.buf = buf
+        self.view = view
+        self.chunks = [buf] if buf else []
+        self.starts = [0] if buf else []
         self.len = len(buf)
         self.buflist = []
+        self.buflen = 0
+        # Offsets of the line starts in [0, indexed].
+        self.lines = array.array('q', [0])
+        self.indexed = 0
+        self.line = 0
+        # (chunk, start) of the last line read past the index; only writes
+        # before the end and truncate() change a chunk's contents.
+        self.reading = None
         self.pos = 0
         self.closed = False
         self.softspace = 0
@@ -73,9 +237,19 @@ class StringIO:
         or raises StopIteration when EOF is hit.
         """
         _complain_ifclosed(self.closed)
-        r = self.readline()
-        if not r:
+        pos = self.pos
+        # _next_line's common case, inlined
+        if self.reading is not None and pos >= self.indexed:
+            c, start = self.reading
+            if pos >= start:
+                j = c.find('\n', pos - start)
+                if j >= 0:
+                    self.pos = start + j + 1
+                    return c[pos - start:j + 1]
+        if pos >= self.len:
+            self.pos = self.len
             raise StopIteration
+        r, self.pos = self._next_line(pos)
         return r
 
     def close(self):
@@ -83,7 +257,7 @@ class StringIO:
         """
         if not self.closed:
             self.closed = True
-            del self.buf, self.pos
+            del self.chunks, self.starts, self.buflist, self.lines, self.pos
 
     def isatty(self):
         """Returns False because StringIO objects are not connected to a
@@ -102,15 +276,25 @@ class StringIO:
         There is no return value.
         """
         _complain_ifclosed(self.closed)
-        if self.buflist:
-            self.buf += ''.join(self.buflist)
-            self.buflist = []
         if mode == 1:
             pos += self.pos
         elif mode == 2:
             pos += self.len
         self.pos = max(0, pos)
 
+    def seek_line(self, n):
+        """Set the file's current position to the start of line n
+        (counting from 0), or to EOF if there are not that many lines.
+
+        There is no return value.
+        """
+        _complain_ifclosed(self.closed)
+        if n < 0:
+            raise IOError(EINVAL, "Negative line number not allowed")
+        while len(self.lines) <= n and self.indexed < self.len:
+            self._index()
+        self.pos = self.lines[n] if n < len(self.lines) else self.len
+
     def tell(self):
         """Return the file's current position."""
         _complain_ifclosed(self.closed)
@@ -125,14 +309,11 @@ class StringIO:
         string is returned when EOF is encountered immediately.
         """
         _complain_ifclosed(self.closed)
-        if self.buflist:
-            self.buf += ''.join(self.buflist)
-            self.buflist = []
         if n is None or n < 0:
             newpos = self.len
         else:
             newpos = min(self.pos+n, self.len)
-        r = self.buf[self.pos:newpos]
+        r = self._slice(self.pos, newpos)
         self.pos = newpos
         return r
 
@@ -150,18 +331,15 @@ class StringIO:
         characters ('\0') if they occurred in the input.
         """
         _complain_ifclosed(self.closed)
-        if self.buflist:
-            self.buf += ''.join(self.buflist)
-            self.buflist = []
-        i = self.buf.find('\n', self.pos)
-        if i < 0:
-            newpos = self.len
-        else:
-            newpos = i+1
+        pos = self.pos
+        if pos >= self.len:
+            self.pos = self.len
+            return ''
+        r, newpos = self._next_line(pos)
         if length is not None and length > 0:
-            if self.pos + length < newpos:
-                newpos = self.pos + length
-        r = self.buf[self.pos:newpos]
+            if pos + length < newpos:
+                newpos = pos + length
+                r = self._slice(pos, newpos)
         self.pos = newpos
         return r
 
@@ -173,15 +351,21 @@ class StringIO:
         to EOF, whole lines totalling approximately sizehint bytes (or more
         to accommodate a final whole line).
         """
+        _complain_ifclosed(self.closed)
+        if sizehint <= 0:
+            return list(self)
         total = 0
         lines = []
-        line = self.readline()
-        while line:
+        pos = min(self.pos, self.len)
+        next_line = self._next_line
+        while pos < self.len:
+            line, end = next_line(pos)
             lines.append(line)
-            total += len(line)
+            total += end - pos
+            pos = end
             if 0 < sizehint <= total:
                 break
-            line = self.readline()
+        self.pos = pos
         return lines
 
     def truncate(self, size=None):
@@ -202,8 +386,12 @@ class StringIO:
             raise IOError(EINVAL, "Negative size not allowed")
         elif size < self.pos:
             self.pos = size
-        self.buf = self.getvalue()[:size]
-        self.len = size
+        if size < self.len:
+            self.reading = None
+            self._unindex(size)
+            i = self._split(size)
+            del self.chunks[i:], self.starts[i:]
+            self.len = size
 
     def write(self, s):
         """Write a string to the file.
@@ -212,32 +400,181 @@ class StringIO:
         """
         _complain_ifclosed(self.closed)
         if not s: return
-        # Force s to be a string or unicode
-        if not isinstance(s, str):
+        # Force s to be a string or unicode (or a view of one)
+        if not isinstance(s, (str, StringView)):
             s = str(s)
         spos = self.pos
         slen = self.len
-        if spos == slen:
-            self.buflist.append(s)
-            self.len = self.pos = spos + len(s)
-            return
         if spos > slen:
-            self.buflist.append('\0'*(spos - slen))
+            self._append('\0'*(spos - slen))
             slen = spos
         newpos = spos + len(s)
-        if spos < slen:
-            if self.buflist:
-                self.buf += ''.join(self.buflist)
-            self.buflist = [self.buf[:spos], s, self.buf[newpos:]]
-            self.buf = ''
-            if newpos > slen:
-                slen = newpos
+        if spos == slen:
+            self._append(s)
         else:
-            self.buflist.append(s)
-            slen = newpos
-        self.len = slen
+            # Replace the chunks covering [spos, newpos) by s. Lengths
+            # before newpos are unchanged, so later starts still hold.
+            self.reading = None
+            i = self._split(spos)
+            j = self._split(min(newpos, slen))
+            self.chunks[i:j] = [s]
+            self.starts[i:j] = [spos]
+            self._reindex(spos, newpos)
+        self.len = max(slen, newpos)
         self.pos = newpos
 
+    def _append(self, s):
+        if len(s) < CHUNK and not isinstance(s, StringView):
+            self.buflist.append(s)
+            self.buflen += len(s)
+            if self.buflen >= CHUNK:
+                self._flush()
+            return
+        self._flush()
+        self.starts.append(self._end())
+        self.chunks.append(s)
+
+    def _flush(self):
+        # Pending small writes at the end become one chunk.
+        if self.buflist:
+            self.starts.append(self._end())
+            self.chunks.append(_concat(self.buflist))
+            self.buflist = []
+            self.buflen = 0
+
+    def _end(self):
+        return self.starts[-1] + len(self.chunks[-1]) if self.chunks else 0
+
+    def _split(self, pos):
+        """Index of the chunk starting at pos, splitting the chunk
+        containing it if needed."""
+        self._flush()
+        if pos >= self.len:
+            return len(self.chunks)
+        i = bisect.bisect_right(self.starts, pos) - 1
+        k = pos - self.starts[i]
+        if k:
+            c = self.chunks[i]
+            self.chunks[i:i+1] = [c[:k], c[k:]]
+            self.starts.insert(i+1, pos)
+            i += 1
+        return i
+
+    def _slice(self, lo, hi):
+        if lo >= hi:
+            return ''
+        self._flush()
+        chunks, starts = self.chunks, self.starts
+        i = bisect.bisect_right(starts, lo) - 1
+        c = chunks[i]
+        if hi <= starts[i] + len(c):
+            if self.view:
+                return StringView(c, lo - starts[i], hi - starts[i])
+            return _str(c[lo - starts[i]:hi - starts[i]])
+        pieces = [c[lo - starts[i]:]]
+        i += 1
+        while starts[i] + len(chunks[i]) < hi:
+            pieces.append(chunks[i])
+            i += 1
+        pieces.append(chunks[i][:hi - starts[i]])
+        return _concat(pieces)
+
+    def _line_end(self, pos):
+        """Start of the line after the one at pos, or the length."""
+        lines = self.lines
+        # Reading line after line, pos is the start found last time.
+        k = self.line + 1
+        if k < len(lines) and lines[k - 1] == pos:
+            self.line = k
+            return lines[k]
+        while lines[-1] <= pos and self.indexed < self.len:
+            self._index()
+        k = bisect.bisect_right(lines, pos)
+        if k == len(lines):
+            return self.len
+        self.line = k
+        return lines[k]
+
+    def _index(self):
+        # Extend the line index over (part of) the next unindexed chunk.
+        self._flush()
+        pos = self.indexed
+        i = bisect.bisect_right(self.starts, pos) - 1
+        c, start = self.chunks[i], self.starts[i]
+        end = min(len(c), pos - start + SCAN)
+        k = c.find('\n', pos - start, end)
+        while k >= 0:
+            self.lines.append(start + k + 1)
+            k = c.find('\n', k + 1, end)
+        self.indexed = start + end
+
+    def _next_line(self, pos):
+        """The line at pos (before the end) and the position after it."""
+        if pos < self.indexed:
+            end = self._line_end(pos)
+            return self._slice(pos, end), end
+        # Past the index a line is looked for with find(), as a rule in
+        # the (str) chunk read last time.
+        if self.reading is not None:
+            c, start = self.reading
+            if pos >= start:
+                j = c.find('\n', pos - start)
+                if j >= 0:
+                    return c[pos - start:j + 1], start + j + 1
+        self._flush()
+        i = bisect.bisect_right(self.starts, pos) - 1
+        c, start = self.chunks[i], self.starts[i]
+        j = c.find('\n', pos - start)
+        if j < 0:
+            end = self._eol(pos)
+            return self._slice(pos, end), end
+        if self.view:
+            return StringView(c, pos - start, j + 1), start + j + 1
+        if not isinstance(c, StringView):
+            self.reading = (c, start)
+        return _str(c[pos - start:j + 1]), start + j + 1
+
+    def _eol(self, pos):
+        """Start of the line after the one at pos, or the length, found
+        with find() where there is no index yet."""
+        self._flush()
+        chunks, starts = self.chunks, self.starts
+        i = bisect.bisect_right(starts, pos) - 1
+        k = pos - starts[i]
+        while i < len(chunks):
+            j = chunks[i].find('\n', k)
+            if j >= 0:
+                return starts[i] + j + 1
+            i += 1
+            k = 0
+        return self.len
+
+    def _reindex(self, lo, hi):
+        # A write over [lo, hi) leaves everything before hi where it was,
+        # so only the line starts in (lo, hi] can change.
+        hi = min(hi, self.indexed)
+        if lo >= hi:
+            return
+        found = array.array('q')
+        chunks, starts = self.chunks, self.starts
+        i = bisect.bisect_right(starts, lo) - 1
+        while i < len(chunks) and starts[i] < hi:
+            c, start = chunks[i], starts[i]
+            k = c.find('\n', max(lo - start, 0), hi - start)
+            while k >= 0:
+                found.append(start + k + 1)
+                k = c.find('\n', k + 1, hi - start)
+            i += 1
+        lines = self.lines
+        lines[bisect.bisect_right(lines, lo):bisect.bisect_right(lines, hi)] = found
+
+    def _unindex(self, pos):
+        # Line starts up to pos still follow the same newlines.
+        if pos < self.indexed:
+            del self.lines[bisect.bisect_right(self.lines, pos):]
+            self.indexed = pos
+            self.line = 0
+
     def writelines(self, iterable):
         """Write a sequence of strings to the file. The sequence can be any
         iterable object producing strings, typically a list of strings. There
@@ -266,10 +603,204 @@ class StringIO:
         8th bit) will cause a UnicodeError to be raised when getvalue()
         is called.
         """
-        if self.buflist:
-            self.buf += ''.join(self.buflist)
-            self.buflist = []
-        return self.buf
+        self._flush()
+        if len(self.chunks) > 1 or self.chunks and isinstance(self.chunks[0], StringView):
+            self.chunks = [_concat(self.chunks)]
+            self.starts = [0]
+        return self.chunks[0] if self.chunks else ''
+
+
+class BytesIO:
+    """class BytesIO([initial_bytes])
+
+    A file-like object reading from and writing to a bytes buffer, with
+    the interface of io.BytesIO. initial_bytes may be any bytes-like
+    object; a bytes object (or subclass) is read from without a copy
+    until the first write.
+    """
+    def __init__(self, initial_bytes = b''):
+        if initial_bytes is None:
+            initial_bytes = b''
+        if isinstance(initial_bytes, bytes):
+            self.buf = initial_bytes
+            self.owned = False
+        else:
+            self.buf = bytearray(initial_bytes)
+            self.owned = True
+        self.pos = 0
+        self.closed = False
+        # Set by getbuffer(); cleared once its views are all released.
+        self.exported = False
+
+    def __enter__(self):
+        _complain_ifclosed(self.closed)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        _complain_ifclosed(self.closed)
+        r = self.readline()
+        if not r:
+            raise StopIteration
+        return r
+
+    def close(self):
+        if not self.closed:
+            self._check_exports()
+            self.closed = True
+            del self.buf
+
+    def isatty(self):
+        _complain_ifclosed(self.closed)
+        return False
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, mode = 0):
+        _complain_ifclosed(self.closed)
+        if mode == 0:
+            if pos < 0:
+                raise ValueError("negative seek value %d" % pos)
+        elif mode == 1:
+            pos += self.pos
+        elif mode == 2:
+            pos += len(self.buf)
+        else:
+            raise ValueError("invalid whence (%r, should be 0, 1 or 2)" % (mode,))
+        self.pos = max(0, pos)
+        return self.pos
+
+    def tell(self):
+        _complain_ifclosed(self.closed)
+        return self.pos
+
+    def _read(self, end):
+        pos = self.pos
+        if pos >= end:
+            return b''
+        self.pos = end
+        if not self.owned:
+            return self.buf[pos:end]
+        with memoryview(self.buf) as m:
+            return m[pos:end].tobytes()
+
+    def read(self, n = -1):
+        _complain_ifclosed(self.closed)
+        size = len(self.buf)
+        if n is None or n < 0:
+            return self._read(size)
+        return self._read(min(self.pos + n, size))
+
+    read1 = read
+
+    def readline(self, size = -1):
+        _complain_ifclosed(self.closed)
+        end = len(self.buf)
+        if size is not None and size >= 0:
+            end = min(self.pos + size, end)
+        i = self.buf.find(b'\n', self.pos, end)
+        return self._read(i + 1 if i >= 0 else end)
+
+    def readlines(self, sizehint = 0):
+        _complain_ifclosed(self.closed)
+        total = 0
+        lines = []
+        for line in self:
+            lines.append(line)
+            total += len(line)
+            if 0 < sizehint <= total:
+                break
+        return lines
+
+    def readinto(self, b):
+        """Read up to len(b) bytes into the writable buffer b and return
+        how many were read."""
+        _complain_ifclosed(self.closed)
+        with memoryview(b) as view, view.cast('B') as out:
+            n = max(0, min(len(out), len(self.buf) - self.pos))
+            with memoryview(self.buf) as m:
+                out[:n] = m[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def _own(self):
+        # Copy on write.
+        if not self.owned:
+            self.buf = bytearray(self.buf)
+            self.owned = True
+
+    def _check_exports(self):
+        # Like io.BytesIO, refuse to change the buffer while a view from
+        # getbuffer() is alive, even when its size would stay the same.
+        # The bytearray itself only refuses to be resized, so try that.
+        if self.exported:
+            try:
+                self.buf.append(0)
+            except BufferError:
+                raise BufferError("Existing exports of data: object cannot be re-sized") from None
+            del self.buf[-1]
+            self.exported = False
+
+    def write(self, b):
+        _complain_ifclosed(self.closed)
+        self._check_exports()
+        with memoryview(b) as m:
+            n = m.nbytes
+            if not n:
+                return 0
+            self._own()
+            buf, pos = self.buf, self.pos
+            if pos > len(buf):
+                buf.extend(bytes(pos - len(buf)))
+            buf[pos:pos + n] = m.cast('B')
+        self.pos = pos + n
+        return n
+
+    def writelines(self, iterable):
+        write = self.write
+        for line in iterable:
+            write(line)
+
+    def truncate(self, size=None):
+        _complain_ifclosed(self.closed)
+        self._check_exports()
+        if size is None:
+            size = self.pos
+        elif size < 0:
+            raise ValueError("negative size value %d" % size)
+        if size < len(self.buf):
+            self._own()
+            del self.buf[size:]
+        return size
+
+    def flush(self):
+        _complain_ifclosed(self.closed)
+
+    def getvalue(self):
+        """Retrieve the entire contents of the buffer as bytes."""
+        _complain_ifclosed(self.closed)
+        return bytes(self.buf) if self.owned else self.buf
+
+    def getbuffer(self):
+        """A memoryview of the contents, which can be read and written in
+        place. write(), truncate() and close() raise BufferError while
+        the view (or one made from it) is alive."""
+        _complain_ifclosed(self.closed)
+        self._own()
+        self.exported = True
+        return memoryview(self.buf)
 
 
 # A little test suite
@@ -312,10 +843,10 @@ def test():
     print('File length =', f.tell())
     if f.tell() != length:
         raise RuntimeError('bad length')
-    f.truncate(length/2)
+    f.truncate(length//2)
     f.seek(0, 2)
     print('Truncated length =', f.tell())
-    if f.tell() != length/2:
+    if f.tell() != length//2:
         raise RuntimeError('truncate did not adjust length')
     f.close()
 
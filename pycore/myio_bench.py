@@ -0,0 +1,433 @@
+"""Benchmark myio.StringIO against io.StringIO, and check that they agree.
+
+For every workload and size this times myio.StringIO and the C
+io.StringIO on the same operations, and reports operations per second,
+the peak memory the workload allocated (traced with tracemalloc, in a
+separate run so tracing doesn't skew the timing) and myio's slowdown.
+
+    write       append the text line by line, then getvalue()
+    seek        random seek/write/seek/read on the whole text
+    readline    iterate over the lines of the text
+    mixed       append lines, every 16th seek back and readline()
+    taint       as write, with tainted lines (a str subclass that, like
+                tstr, carries the input offset of each character), then
+                iterate over the lines; only up to 16M
+
+--fuzz N first runs N seeds of random operation sequences on myio and io
+(StringIO, StringIO with view=True, and BytesIO) and stops at the first
+disagreement, printing the seed and the operations that led to it. Some
+of the initial values and writes are tainted, and what myio returns must
+carry the taint of every character, where plain characters count as
+untainted. The comparison allows for the ways myio.StringIO deliberately
+keeps the old StringIO behaviour:
+
+- read(), readline() and readlines() at a position past EOF move the
+  position back to EOF.
+- truncate(size) moves the position back to size if it was past it.
+- readline(0) reads a whole line.
+- readlines(sizehint) stops once the total reaches sizehint, where io
+  stops once it exceeds it.
+
+    python3 -m pycore.myio_bench --fuzz 200 --sizes 1K,1M,100M
+"""
+import argparse
+import array
+import io
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from pycore import myio
+
+LINE = 'line %d: the quick brown fox jumps over the lazy dog\n'
+
+def make_text(size):
+    lines, n = [], 0
+    while n < size:
+        lines.append(LINE % len(lines))
+        n += len(lines[-1])
+    return ''.join(lines)[:size]
+
+def parse_size(s):
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    s = s.strip().upper().rstrip('B')
+    if s[-1:] in units:
+        return int(float(s[:-1]) * units[s[-1]])
+    return int(s)
+
+class Tainted(str):
+    """A str subclass that, like tstr, keeps the input offset of each
+    character through slicing and +; characters from a plain str have
+    offset -1."""
+    def __new__(cls, s, taint):
+        t = str.__new__(cls, s)
+        t.taint = taint
+        return t
+
+    def __getitem__(self, k):
+        if isinstance(k, int):
+            k = slice(k, k + 1 or None)
+        return Tainted(str.__getitem__(self, k), self.taint[k])
+
+    def __add__(self, other):
+        return Tainted(str.__add__(self, other), self.taint + taint_of(other))
+
+    def __radd__(self, other):
+        return Tainted(str.__add__(other, self), taint_of(other) + self.taint)
+
+def taint_of(s):
+    return s.taint if isinstance(s, Tainted) else array.array('q', [-1]) * len(s)
+
+def tainted(lines):
+    out, n = [], 0
+    for line in lines:
+        out.append(Tainted(line, array.array('q', range(n, n + len(line)))))
+        n += len(line)
+    return out
+
+# Workloads take the class, the text, its lines and a random generator,
+# and return the number of operations done.
+
+SEEKS = 10000
+
+def write_heavy(cls, text, lines, rng):
+    f = cls()
+    for line in lines:
+        f.write(line)
+    f.getvalue()
+    return len(lines) + 1
+
+def seek_heavy(cls, text, lines, rng):
+    f = cls(text)
+    n = len(text)
+    for _ in range(SEEKS):
+        f.seek(rng.randrange(n))
+        f.write('XXXXXXXX')
+        f.seek(rng.randrange(n))
+        f.read(16)
+    return 4 * SEEKS
+
+def readline_heavy(cls, text, lines, rng):
+    f = cls(text)
+    n = 0
+    for _ in f:
+        n += 1
+    return n
+
+def mixed(cls, text, lines, rng):
+    f = cls()
+    ops = 0
+    for i, line in enumerate(lines):
+        f.write(line)
+        ops += 1
+        if i % 16 == 15:
+            f.seek(rng.randrange(f.tell()))
+            f.readline()
+            f.seek(0, 2)
+            ops += 3
+    f.getvalue()
+    return ops + 1
+
+def taint_heavy(cls, text, lines, rng):
+    # bench() passes tainted lines
+    f = cls()
+    for line in lines:
+        f.write(line)
+    f.getvalue()
+    f.seek(0)
+    n = 0
+    for _ in f:
+        n += 1
+    return len(lines) + 2 + n
+
+WORKLOADS = {'write': write_heavy, 'seek': seek_heavy, 'readline': readline_heavy,
+             'mixed': mixed, 'taint': taint_heavy}
+# Workloads that get tainted lines, and the largest text they run on (the
+# offsets take 8 bytes a character, and joining them twice that).
+TAINTED = {'taint'}
+TAINT_MAX = 1 << 24
+IMPLS = {'io': io.StringIO, 'myio': myio.StringIO}
+
+def timed(workload, cls, text, lines):
+    rng = random.Random(len(text))
+    start = time.perf_counter()
+    ops = workload(cls, text, lines, rng)
+    return ops, time.perf_counter() - start
+
+def peak_memory(workload, cls, text, lines):
+    tracemalloc.start()
+    try:
+        workload(cls, text, lines, random.Random(len(text)))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench(workloads, sizes, repeat, memory=True):
+    for n in sizes:
+        text = make_text(n)
+        plain, tainted_lines = text.splitlines(True), None
+        for name in workloads:
+            workload = WORKLOADS[name]
+            lines = plain
+            if name in TAINTED:
+                if n > TAINT_MAX:
+                    continue
+                if tainted_lines is None:
+                    tainted_lines = tainted(plain)
+                lines = tainted_lines
+            secs = {}
+            for impl, cls in IMPLS.items():
+                runs = [timed(workload, cls, text, lines) for _ in range(repeat)]
+                ops = runs[0][0]
+                secs[impl] = statistics.median(s for _, s in runs)
+                yield {'workload': name, 'size': n, 'impl': impl, 'ops': ops,
+                       'secs': secs[impl], 'ops_per_sec': ops / secs[impl] if secs[impl] else float('inf'),
+                       'peak_kb': peak_memory(workload, cls, text, lines) // 1024 if memory else -1,
+                       'slowdown': secs[impl] / secs['io'] if secs['io'] else float('inf')}
+
+# Differential fuzzing.
+
+def text_of(v):
+    return v.materialize() if isinstance(v, myio.StringView) else v
+
+def fuzz_text(seed, steps=200, view=False):
+    """Run a random sequence of operations on a myio.StringIO and an
+    io.StringIO, raising RuntimeError at the first disagreement."""
+    rng = random.Random(seed)
+    offset = 0
+    def text(s):
+        # Half of the strings are tainted, each character with its own offset.
+        nonlocal offset
+        if rng.randrange(2):
+            s = Tainted(s, array.array('q', range(offset, offset + len(s))))
+            offset += len(s)
+        return s
+    init = text(''.join(rng.choice('ab\n') for _ in range(rng.randrange(64))))
+    a, b = io.StringIO(init), myio.StringIO(init, view=view)
+    log = ['StringIO(%r, view=%r)' % (init, view)]
+    # The offsets of the characters in b, which io doesn't keep.
+    taint = list(taint_of(init))
+    def written(pos, s):
+        taint[len(taint):pos] = [-1] * (pos - len(taint))
+        taint[pos:pos + len(s)] = taint_of(s)
+        return pos + len(s)
+    def check(what, x, y):
+        if x != y:
+            raise RuntimeError('seed %d: %s: io gave %r, myio %r after\n  %s'
+                               % (seed, what, x, y, '\n  '.join(log)))
+    def check_taint(what, start, s):
+        check(what + ' taint', taint[start:start + len(s)], list(taint_of(s)))
+    for _ in range(steps):
+        op = rng.randrange(10)
+        start = b.tell()
+        if op == 0:
+            s = text(''.join(rng.choice('xyz\n') for _ in range(rng.choice([0, 1, 3, 17, myio.CHUNK + 1]))))
+            log.append('write(%d chars, %s)' % (len(s), type(s).__name__))
+            a.write(s)
+            b.write(s)
+            written(start, s)
+        elif op == 1:
+            whence = rng.randrange(3)
+            pos = rng.randrange(160) - (80 if whence else 0)
+            log.append('seek(%d, %d)' % (pos, whence))
+            # io.StringIO only seeks relative by 0
+            base = a.tell() if whence == 1 else len(a.getvalue()) if whence == 2 else 0
+            a.seek(max(0, base + pos))
+            b.seek(pos, whence)
+        elif op == 2:
+            n = rng.randrange(-1, 40)
+            log.append('read(%d)' % n)
+            r = text_of(b.read(n))
+            check('read', a.read(n), r)
+            check_taint('read', start, r)
+        elif op == 3:
+            n = rng.choice([None, 1, 5, 40])
+            log.append('readline(%r)' % n)
+            r = text_of(b.readline(n))
+            check('readline', a.readline(n) if n else a.readline(), r)
+            check_taint('readline', start, r)
+        elif op == 4:
+            hint = rng.randrange(24)
+            log.append('readlines(%d)' % hint)
+            expected, total = [], 0
+            for line in iter(a.readline, ''):
+                expected.append(line)
+                total += len(line)
+                if 0 < hint <= total:
+                    break
+            r = [text_of(line) for line in b.readlines(hint)]
+            check('readlines', expected, r)
+            for line in r:
+                check_taint('readlines', start, line)
+                start += len(line)
+        elif op == 5:
+            log.append('next()')
+            r = text_of(next(b, None))
+            check('next', next(a, None), r)
+            check_taint('next', start, r or '')
+        elif op == 6:
+            log.append('getvalue()')
+            r = b.getvalue()
+            check('getvalue', a.getvalue(), r)
+            check_taint('getvalue', 0, r)
+        elif op == 7:
+            n = rng.randrange(120)
+            log.append('truncate(%d)' % n)
+            a.truncate(n)
+            b.truncate(n)
+            del taint[n:]
+        elif op == 8:
+            n = rng.randrange(24)
+            log.append('seek_line(%d)' % n)
+            v = a.getvalue()
+            starts = [0] + [i + 1 for i, c in enumerate(v) if c == '\n']
+            a.seek(starts[n] if n < len(starts) else len(v))
+            b.seek_line(n)
+        else:
+            log.append('writelines()')
+            lines = [text(rng.choice(['a\n', 'bc', '\n'])) for _ in range(rng.randrange(5))]
+            a.writelines(lines)
+            b.writelines(lines)
+            for line in lines:
+                start = written(start, line)
+        # myio moves the position back (see above)
+        if op == 7 and n < a.tell():
+            a.seek(n)
+        elif op in (2, 3, 4, 5) and a.tell() > len(a.getvalue()):
+            a.seek(0, 2)
+        check('tell', a.tell(), b.tell())
+    check('getvalue', a.getvalue(), b.getvalue())
+    check_taint('getvalue', 0, b.getvalue())
+
+def outcome(fn, *args):
+    try:
+        return fn(*args)
+    except (ValueError, BufferError) as e:
+        return type(e).__name__
+
+def fuzz_bytes(seed, steps=200):
+    """As fuzz_text, for myio.BytesIO against io.BytesIO."""
+    rng = random.Random(seed)
+    init = bytes(rng.choice(b'ab\n') for _ in range(rng.randrange(64)))
+    a, b = io.BytesIO(init), myio.BytesIO(init if seed % 2 else bytearray(init))
+    held = []
+    log = ['BytesIO(%r)' % init]
+    def check(what, x, y):
+        if x != y:
+            raise RuntimeError('seed %d: %s: io gave %r, myio %r after\n  %s'
+                               % (seed, what, x, y, '\n  '.join(log)))
+    for _ in range(steps):
+        op = rng.randrange(9)
+        if op == 0:
+            s = bytes(rng.choice(b'xyz\n') for _ in range(rng.choice([0, 1, 3, 17, 500])))
+            log.append('write(%d bytes)' % len(s))
+            check('write', outcome(a.write, s), outcome(b.write, s))
+        elif op == 1:
+            whence = rng.choice([0, 0, 1, 2, 3])
+            pos = rng.randrange(160) - (20 if whence == 0 else 80)
+            log.append('seek(%d, %d)' % (pos, whence))
+            check('seek', outcome(a.seek, pos, whence), outcome(b.seek, pos, whence))
+        elif op == 2:
+            n = rng.randrange(-1, 40)
+            log.append('read(%d)' % n)
+            check('read', a.read(n), b.read(n))
+        elif op == 3:
+            n = rng.choice([-1, 0, 1, 5, 40])
+            log.append('readline(%d)' % n)
+            check('readline', a.readline(n), b.readline(n))
+        elif op == 4:
+            hint = rng.randrange(24)
+            log.append('readlines(%d)' % hint)
+            check('readlines', a.readlines(hint), b.readlines(hint))
+        elif op == 5:
+            n = rng.randrange(24)
+            x, y = bytearray(n), bytearray(n)
+            log.append('readinto(%d)' % n)
+            check('readinto', (a.readinto(x), x), (b.readinto(y), y))
+        elif op == 6:
+            n = rng.randrange(-2, 120)
+            log.append('truncate(%d)' % n)
+            check('truncate', outcome(a.truncate, n), outcome(b.truncate, n))
+        elif op == 7:
+            # Keep a view alive for a few operations, or release them.
+            if held and rng.randrange(2):
+                log.append('release()')
+                for view in held:
+                    view.release()
+                del held[:]
+            else:
+                log.append('getbuffer() kept')
+                held += [a.getbuffer(), b.getbuffer()]
+        else:
+            log.append('getbuffer()')
+            with a.getbuffer() as x, b.getbuffer() as y:
+                check('getbuffer', bytes(x), bytes(y))
+        check('tell', a.tell(), b.tell())
+    check('getvalue', a.getvalue(), b.getvalue())
+    def closed(f):
+        with f:
+            return f.getvalue()
+    check('with', outcome(closed, a), outcome(closed, b))
+    check('closed', a.closed, b.closed)
+    for view in held:
+        view.release()
+    check('close', outcome(a.close), outcome(b.close))
+    check('with', outcome(closed, a), outcome(closed, b))
+
+def fuzz(seeds, steps=200):
+    for seed in range(seeds):
+        fuzz_text(seed, steps)
+        fuzz_text(seed, steps, view=True)
+        fuzz_bytes(seed, steps)
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="pycore.myio_bench",
+        description="Benchmark myio.StringIO against io.StringIO, and fuzz them against each other.",
+    )
+    parser.add_argument(
+        '-s', '--sizes', default='1K,1M,100M',
+        help="comma separated text sizes, with an optional K, M or G suffix.",
+    )
+    parser.add_argument(
+        '-w', '--workloads', default=','.join(WORKLOADS),
+        help="comma separated workloads (default: all of %s)." % ', '.join(WORKLOADS),
+    )
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help="runs per measurement; the median is reported.",
+    )
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help="skip the (slow) traced run that measures peak memory.",
+    )
+    parser.add_argument(
+        '--fuzz', dest='fuzz', type=int, default=0, metavar='N',
+        help="first check myio against io on N random operation sequences.",
+    )
+    parser.add_argument(
+        '--fuzz-only', dest='fuzz_only', action='store_true',
+        help="only fuzz, don't benchmark.",
+    )
+    args = parser.parse_args(argv)
+    if args.fuzz:
+        try:
+            fuzz(args.fuzz)
+        except RuntimeError as e:
+            print('MISMATCH', e)
+            sys.exit(1)
+        print('fuzz: %d seeds agree' % args.fuzz, flush=True)
+    if args.fuzz_only:
+        return
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    workloads = args.workloads.split(',')
+    print('%-9s %10s %5s %10s %14s %10s %9s' % ('workload', 'size', 'impl', 'secs', 'ops/s',
+        'peak KB', 'vs io'))
+    for r in bench(workloads, sizes, args.repeat, args.memory):
+        print('%-9s %10d %5s %10.4f %14.0f %10d %9.2f' % (r['workload'], r['size'], r['impl'],
+            r['secs'], r['ops_per_sec'], r['peak_kb'], r['slowdown']), flush=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,4 +1,4 @@
-import pychains.execfile
+import trackingvm.execfile
 import sys
 
-pychains.execfile.ExecFile().cmdline(sys.argv)
+trackingvm.execfile.ExecFile().cmdline(sys.argv[1:])
@@ -0,0 +1,66 @@
+
+import builtins
+import os
+import sys
+import tempfile
+import types
+from unittest import TestCase, mock
+
+from trackingvm import cache
+
+
+class CacheTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        env = mock.patch.dict(os.environ, {'TRACKINGVM_CACHE': os.path.join(self.dir.name, 'cache')})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(self.dir.cleanup)
+
+    def test_compile_once(self):
+        code = cache.compile_source('x = 1\n', 'a.py')
+        self.assertTrue(os.path.exists(cache.cache_path(b'x = 1\n', 'a.py')))
+        with mock.patch.object(cache.builtins, 'compile', side_effect=AssertionError('compiled')):
+            self.assertEqual(cache.compile_source(b'x = 1\n', 'a.py'), code)
+        # another file name or source is another entry
+        self.assertNotEqual(cache.cache_path(b'x = 1\n', 'b.py'), cache.cache_path(b'x = 1\n', 'a.py'))
+        self.assertNotEqual(cache.cache_path(b'x = 2\n', 'a.py'), cache.cache_path(b'x = 1\n', 'a.py'))
+
+    def test_corrupt_entry(self):
+        path = cache.cache_path(b'x = 1\n', 'a.py')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'junk')
+        env = {}
+        exec(cache.compile_source('x = 1\n', 'a.py'), env)
+        self.assertEqual(env['x'], 1)
+
+    def test_only_modules(self):
+        code = cache.compile('1 + 1', 'a.py', 'eval')
+        self.assertEqual(eval(code), 2)
+        self.assertFalse(os.path.exists(cache.cache_dir()))
+
+    def test_installed(self):
+        module = types.ModuleType('runner')
+        src = os.path.join(self.dir.name, 'src')
+        os.makedirs(src)
+        with open(os.path.join(src, 'cached_subject.py'), 'w') as f:
+            f.write('VALUE = 42\n')
+        sys.path.insert(0, src)
+        self.addCleanup(sys.path.remove, src)
+        self.addCleanup(sys.modules.pop, 'cached_subject', None)
+        meta_path = list(sys.meta_path)
+        with cache.installed(module):
+            self.assertIs(module.compile, cache.compile)
+            import cached_subject
+        self.assertEqual(cached_subject.VALUE, 42)
+        self.assertIsInstance(cached_subject.__spec__.loader, cache.CachedLoader)
+        self.assertEqual(len(os.listdir(cache.cache_dir())), 1)
+        self.assertEqual(sys.meta_path, meta_path)
+        self.assertFalse(hasattr(module, 'compile'))
+        # a module's own compile is put back
+        module.compile = builtins.compile
+        with cache.installed(module):
+            pass
+        self.assertIs(module.compile, builtins.compile)
@@ -0,0 +1,72 @@
+
+import dis
+from types import SimpleNamespace
+from unittest import TestCase
+
+from pycore.myio import StringView
+from trackingvm import filters
+from trackingvm.trace import Op
+
+from trackingvm._test.test_trace import Tstr
+
+SOURCE = '''\
+def f(c):
+    if c == 'a':
+        return 1
+    return c in 'xyz'
+'''
+
+
+def compiled():
+    env = {}
+    exec(compile(SOURCE, 'subject.py', 'exec'), env)
+    return env['f'].__code__
+
+
+def frame_at(code, op):
+    # A frame stopped just past the first instruction named op.
+    i = next(i for i in dis.get_instructions(code) if i.opname == op)
+    return SimpleNamespace(f_code=code, f_lasti=i.offset + 2)
+
+
+class FiltersTest(TestCase):
+
+    def setUp(self):
+        self.code = compiled()
+        self.frame = frame_at(self.code, 'COMPARE_OP')
+
+    def test_tainted(self):
+        text = Tstr('ab')
+        self.assertTrue(filters.tainted(Op.EQ.value, text[0], 'a', self.frame))
+        self.assertTrue(filters.tainted(Op.IN.value, 'a', text, self.frame))
+        self.assertTrue(filters.tainted(Op.EQ.value, StringView(text, 1, 2), 'b', self.frame))
+        self.assertFalse(filters.tainted(Op.EQ.value, 'a', 'a', self.frame))
+        self.assertFalse(filters.tainted(Op.EQ.value, Tstr(''), 1, self.frame))
+
+    def test_opnums(self):
+        f = filters.opnums(Op.EQ, Op.IN.value)
+        self.assertTrue(f(Op.EQ.value, 'a', 'b', self.frame))
+        self.assertTrue(f(Op.IN.value, 'a', 'b', self.frame))
+        self.assertFalse(f(Op.LT.value, 'a', 'b', self.frame))
+
+    def test_codes(self):
+        other = compile('x = 1', 'other.py', 'exec')
+        for allowed in ([self.code], ['f'], ['subject.py']):
+            f = filters.codes(*allowed)
+            self.assertTrue(f(Op.EQ.value, 'a', 'b', self.frame))
+            self.assertFalse(f(Op.EQ.value, 'a', 'b', SimpleNamespace(f_code=other)))
+
+    def test_lines(self):
+        self.assertTrue(filters.lines(2, 2)(Op.EQ.value, 'a', 'b', self.frame))
+        self.assertTrue(filters.lines(1, 3, 'subject.py')(Op.EQ.value, 'a', 'b', self.frame))
+        self.assertFalse(filters.lines(3, 4)(Op.EQ.value, 'a', 'b', self.frame))
+        self.assertFalse(filters.lines(1, 3, 'other.py')(Op.EQ.value, 'a', 'b', self.frame))
+
+    def test_all_of(self):
+        self.assertIsNone(filters.all_of([]))
+        self.assertIs(filters.all_of([filters.tainted]), filters.tainted)
+        f = filters.all_of([filters.tainted, filters.opnums(Op.EQ)])
+        text = Tstr('ab')
+        self.assertTrue(f(Op.EQ.value, text[0], 'a', self.frame))
+        self.assertFalse(f(Op.IN.value, text[0], 'a', self.frame))
+        self.assertFalse(f(Op.EQ.value, 'a', 'a', self.frame))
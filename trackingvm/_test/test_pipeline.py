@@ -0,0 +1,83 @@
+
+import io
+import json
+import time
+from unittest import TestCase
+
+from trackingvm.pipeline import Buckets, JsonLines, Pipeline, only
+from trackingvm.trace import CmpTrace, Op
+
+from trackingvm._test.test_trace import Tstr
+
+
+class Collect:
+
+    def __init__(self):
+        self.ops = []
+
+    def __call__(self, ops):
+        self.ops.extend(ops)
+
+
+def scan(t, text, start=0):
+    for i in range(start, len(text)):
+        t.append(Op.EQ.value, text[i], '"', False, 'f.py:3')
+
+
+class PipelineTest(TestCase):
+
+    def test_long_folded_run(self):
+        # Views of the row that is still growing used to join the whole
+        # run each time, which made streaming a scan quadratic.
+        n = 100000
+        text = Tstr('a' * n)
+        t = CmpTrace()
+        collect = Collect()
+        p = Pipeline([collect], batch=256, depth=4)
+        p.attach(t)
+        begin = time.perf_counter()
+        scan(t, text, 0)
+        p.close()
+        self.assertLess(time.perf_counter() - begin, 30)
+        self.assertEqual(t.rows(), 1)
+        self.assertEqual([o.x for o in collect.ops], list(range(n)))
+        self.assertEqual({o.opA for o in collect.ops}, {'a'})
+
+    def test_reopened_run(self):
+        # Reading closes the run; appending to it again reopens it.
+        text = Tstr('abcdefgh')
+        t = CmpTrace()
+        collect = Collect()
+        p = Pipeline([collect], batch=3)
+        p.attach(t)
+        for i in range(4):
+            scan(t, text[:i + 1], i)
+            t.at(0)
+        scan(t, text, 4)
+        p.close()
+        self.assertEqual(t.rows(), 1)
+        self.assertEqual([(o.x, o.opA) for o in collect.ops], list(enumerate('abcdefgh')))
+
+    def test_consumers(self):
+        text = Tstr('ab')
+        t = CmpTrace()
+        out = io.StringIO()
+        buckets = Buckets()
+        p = Pipeline([buckets, JsonLines(out), only(lambda o: o.x == 1, Collect())])
+        p.attach(t)
+        t.append(Op.EQ.value, text[0], 'a', True, 'f.py:1')
+        t.append(Op.LT.value, 1, 2, True, 'f.py:2')
+        t.append(Op.IN.value, text[1], 'xy', False, 'f.py:3')
+        p.close()
+        self.assertEqual(sorted(buckets.buckets), [0, 1])
+        self.assertEqual([json.loads(l) for l in out.getvalue().splitlines()],
+                         [[0, 'EQ', 'a', 'a', True, 'f.py:1'], [1, 'IN', 'b', 'xy', False, 'f.py:3']])
+
+    def test_consumer_error(self):
+        def fail(ops):
+            raise KeyError('boom')
+        t = CmpTrace()
+        p = Pipeline([fail], batch=1, depth=1)
+        p.attach(t)
+        scan(t, Tstr('abcdef'))
+        self.assertRaises(KeyError, p.close)
@@ -0,0 +1,51 @@
+
+import os
+from types import SimpleNamespace
+from unittest import TestCase
+
+from trackingvm.snapshot import Snapshot
+from trackingvm.trace import CmpTrace, Op
+
+from trackingvm._test.test_trace import Tstr
+
+
+class SnapshotTest(TestCase):
+
+    def run_suffixes(self, child):
+        # Fork at offset 2 of 'ab"' with the operands of a comparison on
+        # the stack; child(snapshot, vm) plays the rest of the run.
+        text = Tstr('ab"')
+        s = Snapshot(2, ['c"', '"', 'x'], input=text, jobs=2)
+        vm = SimpleNamespace(frame=SimpleNamespace(stack=[text[2:3], '"']), cmp_trace=CmpTrace())
+        s.fork(vm)
+        if s.child is not None:
+            try:
+                child(s, vm)
+            finally:
+                os._exit(1)
+        return s
+
+    def test_results(self):
+        def child(s, vm):
+            opA, opB = vm.frame.stack
+            vm.cmp_trace.append(Op.EQ.value, opA, opB, opA == opB, 'f.py:1')
+            raised = None if opA == '"' else 'ValueError: expected "'
+            s.finish(vm, raised=raised)
+        s = self.run_suffixes(child)
+        self.assertEqual(sorted(s.results), ['"', 'c"', 'x'])
+        self.assertEqual([(o.x, o.opA, o.result) for o in s.results['c"']], [(2, 'c', False)])
+        self.assertEqual(s.errors, {'c"': 'ValueError: expected "', '"': None,
+                                    'x': 'ValueError: expected "'})
+        self.assertEqual(s.invalid, {})
+
+    def test_invalid(self):
+        def child(s, vm):
+            # compares a character taken from the old input
+            s.check(vm, Tstr('ab"')[2:3], '"')
+            s.finish(vm)
+        s = self.run_suffixes(child)
+        self.assertIsNotNone(s.results['"'])
+        self.assertIsNone(s.results['x'])
+        self.assertIsNone(s.results['c"'])
+        self.assertEqual(sorted(s.invalid), ['c"', 'x'])
+        self.assertIn('offset 2', s.invalid['x'])
@@ -0,0 +1,76 @@
+
+import unittest
+from unittest import TestCase
+
+from trackingvm.summary import Summary
+from trackingvm.trace import CmpTrace, Op
+
+from trackingvm._test.test_trace import Tstr
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def summarize():
+    text = Tstr('ab')
+    t = CmpTrace()
+    s = Summary()
+    s.attach(t)
+    t.append(Op.EQ.value, text[0], 'b', False, 'f.py:1')
+    t.append(Op.EQ.value, text[0], 'a', True, 'f.py:2')
+    t.append(Op.EQ.value, text[0], 'b', False, 'f.py:3')
+    t.append(Op.IN.value, text[1], 'xyz', False, 'f.py:4')
+    t.append(Op.LT.value, text[1], 'm', 'maybe', 'f.py:5')
+    t.append(Op.EQ.value, 'q', 'b', True, 'f.py:6')
+    return t, s
+
+
+class SummaryTest(TestCase):
+
+    def test_lookup(self):
+        t, s = summarize()
+        self.assertEqual(len(s), 2)
+        self.assertEqual(sorted(s[0], key=repr),
+                         [('a', Op.EQ, True), ('b', Op.EQ, False)])
+        self.assertEqual(sorted(s[1], key=repr),
+                         [('m', Op.LT, None), ('xyz', Op.IN, False)])
+        self.assertEqual(s[2], [])
+        self.assertEqual(s.entries(-1), [])
+
+    def test_entries(self):
+        t, s = summarize()
+        b = t.operands.index('b')
+        self.assertIn((b, Op.EQ.value, 0), s.entries(0))
+        self.assertEqual(len(s.entries(0)), 2)
+
+    def test_folded_run(self):
+        t = CmpTrace()
+        s = Summary()
+        s.attach(t)
+        text = Tstr('aaaa')
+        for i in range(4):
+            t.append(Op.EQ.value, text[i], '"', False, 'f.py:1')
+        self.assertEqual(t.rows(), 1)
+        self.assertEqual([s[x] for x in range(4)], [[('"', Op.EQ, False)]] * 4)
+
+    @unittest.skipIf(numpy is None, 'needs numpy')
+    def test_to_numpy(self):
+        t, s = summarize()
+        a = s.to_numpy()
+        self.assertEqual(len(a), 4)
+        self.assertEqual(sorted(a['offset'].tolist()), [0, 0, 1, 1])
+        self.assertEqual(sorted(a['result'].tolist()), [-1, 0, 0, 1])
+
+    @unittest.skipIf(numpy is None, 'needs numpy')
+    def test_bitmap(self):
+        t, s = summarize()
+        m = s.bitmap()
+        self.assertEqual(m.shape, (2, 256))
+        self.assertEqual(m[0, ord('a')], 2)
+        self.assertEqual(m[0, ord('b')], 1)
+        # 'xyz' is not one character and 'maybe' not a bool
+        self.assertEqual(int(m[1].sum()), 0)
+        self.assertEqual(s.bitmap(width=98).shape, (2, 98))
+        self.assertEqual(s.bitmap(width=98)[0, ord('a')], 2)
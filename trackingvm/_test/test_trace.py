@@ -0,0 +1,204 @@
+
+import os
+import struct
+import tempfile
+from unittest import TestCase
+
+from pycore.myio import StringView
+from trackingvm import filters, replay, tracefile
+from trackingvm.trace import ByteTrace, CmpTrace, Op, digest, taint_index
+
+
+class Tstr(str):
+    '''
+    A stand-in for tstr: a string that knows the input offset of each
+    of its characters.
+    '''
+
+    def __new__(cls, s, offset=0):
+        t = str.__new__(cls, s)
+        t.offset = offset
+        return t
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Tstr(str.__getitem__(self, i), self.offset + (i.start or 0))
+        return Tstr(str.__getitem__(self, i), self.offset + i)
+
+    def x(self, i=0):
+        return self.offset + i
+
+
+INPUT = Tstr('abcd')
+
+# (opnum, opA, opB, result, lineinfo) as the VM would append them.
+COMPARISONS = [
+    # a scan of the input, folded into one row
+    (Op.EQ.value, INPUT[0], '"', False, 'f.py:3'),
+    (Op.EQ.value, INPUT[1], '"', False, 'f.py:3'),
+    (Op.EQ.value, INPUT[2], '"', False, 'f.py:3'),
+    # results that are not bools
+    (Op.LT.value, 5, 7, 1, 'f.py:4'),
+    (Op.IN.value, 'b', ['a', 'b'], 'maybe', 'f.py:5'),
+    # offset 1 again, and a tainted comparison that doesn't fold
+    (Op.EQ.value, INPUT[1], 'b', True, 'f.py:6'),
+    (Op.NE.value, INPUT[3], 'd', None, 'f.py:7'),
+    # a run of two that ends the trace
+    (Op.IN.value, INPUT[2], 'xyz', False, 'f.py:8'),
+    (Op.IN.value, INPUT[3], 'xyz', False, 'f.py:8'),
+]
+
+
+def expected(c):
+    opnum, a, b, result, line = c
+    if isinstance(a, Tstr):
+        a, x = str(a), a.x()
+    else:
+        x = -1
+    return (opnum, a, tuple(b) if isinstance(b, list) else b, line, x, result)
+
+
+def fields(o):
+    return (o.opnum, o.opA, o.opB, o.lineinfo, o.x, o.result)
+
+
+def record():
+    t = CmpTrace()
+    for c in COMPARISONS:
+        t.append(*c)
+    return t
+
+
+class CmpTraceTest(TestCase):
+
+    def check(self, t):
+        ops = [expected(c) for c in COMPARISONS]
+        self.assertEqual(len(t), len(ops))
+        self.assertEqual([fields(o) for o in t], ops)
+        self.assertEqual([fields(t[i]) for i in range(len(ops))], ops)
+        self.assertEqual(fields(t[-1]), ops[-1])
+        self.assertEqual([fields(o) for o in t.at(1)], [ops[1], ops[5]])
+        self.assertEqual([fields(o) for o in t.at(3)], [ops[6], ops[8]])
+        self.assertEqual(t.at(4), [])
+        self.assertEqual([fields(o) for o in t.tainted()],
+                         [ops[i] for i in (0, 1, 5, 2, 7, 6, 8)])
+
+    def test_append(self):
+        t = record()
+        self.assertEqual(t.rows(), 6)
+        self.assertEqual(t.count.tolist(), [3, 1, 1, 1, 1, 2])
+        self.check(t)
+
+    def test_frombytes(self):
+        self.check(CmpTrace.frombytes(record().tobytes()))
+
+    def test_keep_operands(self):
+        t = CmpTrace(keep_operands=True)
+        for c in COMPARISONS:
+            t.append(*c)
+        self.assertEqual(t.rows(), len(COMPARISONS))
+        ops = list(t)
+        self.assertIs(ops[1].opA, COMPARISONS[1][1])
+        self.assertEqual(ops[1].opA.x(), ops[1].x)
+        self.assertIs(ops[4].opB, COMPARISONS[4][2])
+        self.assertEqual(record()[1].opA, 'b')
+        self.assertNotIsInstance(record()[1].opA, Tstr)
+
+
+class ViewTest(TestCase):
+
+    def test_taint_index(self):
+        self.assertEqual(taint_index(StringView(INPUT, 1, 2)), 1)
+        self.assertEqual(taint_index(StringView(INPUT, 3, 3)), -1)
+        self.assertEqual(taint_index(StringView('abcd', 1, 2)), -1)
+
+    def test_digest(self):
+        self.assertEqual(digest(StringView(INPUT, 1, 3)), 'bc')
+        self.assertEqual(digest(StringView('x' * 100, 10)), 'x' * 32 + '...')
+
+    def test_recorded(self):
+        v = StringView(INPUT, 2, 3)
+        self.assertTrue(filters.tainted(Op.EQ.value, v, 'c', None))
+        t = CmpTrace()
+        t.append(Op.EQ.value, StringView(INPUT, 1, 2), 'b', False, 'f.py:1')
+        t.append(Op.EQ.value, v, 'b', False, 'f.py:1')
+        self.assertEqual(t.rows(), 1)
+        self.assertEqual([fields(o) for o in t],
+                         [(Op.EQ.value, 'b', 'b', 'f.py:1', 1, False),
+                          (Op.EQ.value, 'c', 'b', 'f.py:1', 2, False)])
+
+
+class TraceFileTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'run.trace')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def byte_trace(self, **kw):
+        bt = ByteTrace(capacity=4, **kw)
+        for i in range(10):
+            bt.append(100 + i, bt.intern(('arg', i % 3)), i, 20 + i)
+        return bt
+
+    def replay_log(self):
+        log = replay.ReplayLog()
+        for line, taken in (('f.py:3', False), ('f.py:6', True), ('f.py:3', True)):
+            log.location.append(log.locations.index(line))
+            log.taken.append(taken)
+        log.imports.append(('re', 'rxpy.re'))
+        return log
+
+    def test_trace_file(self):
+        t, bt = record(), self.byte_trace()
+        tracefile.write(self.path, t, bt, self.replay_log())
+        with tracefile.TraceFile(self.path) as tf:
+            self.assertEqual([fields(o) for o in tf], [fields(o) for o in t])
+            self.assertEqual([fields(tf[i]) for i in range(len(t))], [fields(o) for o in t])
+            for x in range(5):
+                self.assertEqual([fields(o) for o in tf.at(x)], [fields(o) for o in t.at(x)])
+            self.assertEqual([fields(o) for o in tf.tainted()], [fields(o) for o in t.tainted()])
+            # the ring wrapped; only the last four records are written
+            self.assertEqual(tf.n_byte, 4)
+            self.assertEqual([tf.byte(i) for i in range(4)],
+                             [(op, bt.names[arg], frame, line) for op, arg, frame, line in bt])
+            self.assertEqual(tf.byte(0), (106, "('arg', 0)", 6, 26))
+            self.assertEqual([tf.branch(i) for i in range(3)],
+                             [('f.py:3', False), ('f.py:6', True), ('f.py:3', True)])
+            self.assertEqual(tf.imports, [('re', 'rxpy.re')])
+
+    def test_little_endian(self):
+        t = record()
+        tracefile.write(self.path, t, self.byte_trace())
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with tracefile.TraceFile(self.path) as tf:
+            index = struct.unpack_from('<%dQ' % (2 * tf.n_index), data, tf.index_off)
+            self.assertEqual(list(index), [v for rk in t.by_taint() for v in rk])
+            offsets = struct.unpack_from('<%dQ' % (tf.n_strings + 1), data, tf.strings_off)
+            self.assertEqual(list(offsets), list(tf.offsets))
+            self.assertEqual(offsets[-1], len(data) - tf.blobs)
+            self.assertEqual(struct.unpack_from('<4i', data, tf.byte_off)[0], 106)
+
+    def test_file_backed_byte_trace(self):
+        bt = self.byte_trace(path=os.path.join(self.dir.name, 'bytes'))
+        tracefile.write(self.path, byte_trace=bt)
+        bt.close()
+        with tracefile.TraceFile(self.path) as tf:
+            self.assertEqual(len(tf), 0)
+            self.assertEqual([tf.byte(i) for i in range(tf.n_byte)],
+                             [(100 + i, "('arg', %d)" % (i % 3), i, 20 + i) for i in range(10)])
+
+    def test_load(self):
+        t = record()
+        tracefile.write(self.path, t, replay=self.replay_log())
+        loaded, branches, imports = replay.load(self.path)
+        self.assertEqual([fields(o) for o in loaded], [fields(o) for o in t])
+        self.assertEqual([fields(loaded[i]) for i in range(len(t))], [fields(o) for o in t])
+        for x in range(5):
+            self.assertEqual([fields(o) for o in loaded.at(x)], [fields(o) for o in t.at(x)])
+        self.assertEqual([fields(o) for o in loaded.tainted()], [fields(o) for o in t.tainted()])
+        self.assertEqual(branches, [('f.py:3', False), ('f.py:6', True), ('f.py:3', True)])
+        self.assertEqual(imports, [('re', 'rxpy.re')])
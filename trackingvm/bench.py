@@ -0,0 +1,182 @@
+"""Benchmark TrackerVM on the pygen_ex subjects.
+
+For every subject and input size this times the tracked run and a plain
+CPython exec of the same code object, and reports instructions per
+second, comparisons recorded per second, peak RSS and the size of the
+encoded comparison trace. Each measurement runs in its own process, so
+peak RSS belongs to that measurement alone. With --csv, rows are
+appended with the date and git revision, to follow changes over time.
+
+The subjects are read from local files (see the Makefile's subjects/
+rule), so nothing is fetched while benchmarking; a missing subject is an
+error. A measurement whose run raises is reported on stderr and left out
+of the results, and the exit status is then non-zero.
+"""
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import bytevm.sys as vmsys
+from taintedstr import tstr
+
+from .execfile import ExecFile
+from .vm import TrackerVM
+
+# Valid inputs of roughly n characters for the known subjects.
+
+def json_input(n):
+    items = ['{"k%d": [%d, "v%d", true, null]}' % (i, i, i) for i in range(n // 30 + 1)]
+    s = '[' + ', '.join(items) + ']'
+    return s if len(s) <= n else '[' + ', '.join(items[:max(1, n // 30)]) + ']'
+
+def url_input(n):
+    path = '/'.join('seg%d' % i for i in range(n // 5 + 1))
+    return ('https://www.hello.world/' + path)[:max(n, 24)] + '?q1=1#fragment'
+
+INPUTS = {'microjson': json_input, 'urltools': url_input}
+
+def make_input(prog, n):
+    name = os.path.splitext(os.path.basename(prog))[0]
+    return INPUTS.get(name, lambda n: 'a' * n)(n)
+
+def counting(vm):
+    count = [0]
+    dispatch = vm.dispatch
+    def counted(byteName, arguments):
+        count[0] += 1
+        return dispatch(byteName, arguments)
+    vm.dispatch = counted
+    return count
+
+class Failed(Exception):
+    """A run that raised, so its timing means nothing."""
+
+def timed(fn, what):
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        # the inputs are valid, so this is the VM, the harness or the subject
+        raise Failed('%s run raised %s: %s' % (what, type(e).__name__, e)) from None
+    return time.perf_counter() - start
+
+class Measure(ExecFile):
+    def exec_code_object(self, code, env):
+        vm = TrackerVM(trace_ops=())
+        self.vm_secs = timed(lambda: vm.run_code(code, f_globals=dict(env)), 'tracked')
+        self.comparisons = len(vm.cmp_trace)
+        self.trace_bytes = len(vm.cmp_trace.tobytes())
+        counter = TrackerVM(trace_ops=())
+        count = counting(counter)
+        timed(lambda: counter.run_code(code, f_globals=dict(env)), 'counting')
+        self.instructions = count[0]
+        # Natively, the subject sees the real sys; give it the VM's argv.
+        saved = sys.argv
+        sys.argv = list(vmsys.argv)
+        try:
+            self.native_secs = timed(lambda: exec(code, dict(env)), 'native')
+        finally:
+            sys.argv = saved
+
+def measure(prog, n):
+    arg = make_input(prog, n)
+    m = Measure()
+    m.code_cache = False
+    m.run_python_file(prog, [prog, tstr(arg)])
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'vm_secs': m.vm_secs, 'native_secs': m.native_secs, 'instructions': m.instructions,
+            'comparisons': m.comparisons, 'trace_bytes': m.trace_bytes, 'peak_rss_kb': rss,
+            'length': len(arg)}
+
+def isolated(prog, n):
+    with concurrent.futures.ProcessPoolExecutor(1) as pool:
+        return pool.submit(measure, prog, n).result()
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+FIELDS = ['date', 'revision', 'subject', 'size', 'length', 'vm_secs', 'native_secs', 'slowdown',
+          'instructions_per_sec', 'comparisons_per_sec', 'peak_rss_kb', 'trace_bytes']
+
+def bench(progs, sizes, repeat, failures):
+    """Yield a result row per subject and size; measurements that failed
+    are appended to failures as (subject, size, reason) instead."""
+    date, rev = datetime.datetime.now().isoformat(timespec='seconds'), revision()
+    for prog in progs:
+        for n in sizes:
+            try:
+                runs = [isolated(prog, n) for _ in range(repeat)]
+            except Exception as e:
+                # Failed, or the worker itself died
+                failures.append((prog, n, str(e) or type(e).__name__))
+                print('%s %d: %s' % (prog, n, failures[-1][2]), file=sys.stderr, flush=True)
+                continue
+            r = dict(runs[0])
+            for k in ('vm_secs', 'native_secs', 'peak_rss_kb'):
+                r[k] = statistics.median(run[k] for run in runs)
+            vm = r['vm_secs'] or float('inf')
+            yield {'date': date, 'revision': rev, 'subject': os.path.basename(prog), 'size': n,
+                   'length': r['length'], 'vm_secs': r['vm_secs'], 'native_secs': r['native_secs'],
+                   'slowdown': r['vm_secs'] / r['native_secs'] if r['native_secs'] else float('inf'),
+                   'instructions_per_sec': r['instructions'] / vm,
+                   'comparisons_per_sec': r['comparisons'] / vm,
+                   'peak_rss_kb': r['peak_rss_kb'], 'trace_bytes': r['trace_bytes']}
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="trackingvm.bench",
+        description="Benchmark the tracking VM against plain CPython on the given subjects.",
+    )
+    parser.add_argument(
+        '-s', '--sizes', default='16,64,256,1024',
+        help="comma separated input sizes.",
+    )
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help="runs per measurement; the median is reported.",
+    )
+    parser.add_argument(
+        '--csv', dest='csv', metavar='FILE',
+        help="append the results to FILE.",
+    )
+    parser.add_argument(
+        'subjects', nargs='*', default=['subjects/microjson.py', 'subjects/urltools.py'],
+        help="subject programs (default: the pygen_ex subjects under subjects/).",
+    )
+    args = parser.parse_args(argv)
+    missing = [p for p in args.subjects if not os.path.isfile(p)]
+    if missing:
+        parser.error('missing subject %s; fetch it once with `make %s` or copy it there'
+                     % (missing[0], missing[0]))
+    sizes = [int(s) for s in args.sizes.split(',')]
+    out = None
+    if args.csv:
+        exists = os.path.exists(args.csv)
+        out = csv.DictWriter(open(args.csv, 'a', newline=''), FIELDS)
+        if not exists:
+            out.writeheader()
+    print('%-14s %6s %10s %10s %8s %12s %12s %10s %10s' % ('subject', 'size', 'vm s', 'native s',
+        'slowdown', 'instr/s', 'cmp/s', 'rss KB', 'trace B'))
+    failures = []
+    for r in bench(args.subjects, sizes, args.repeat, failures):
+        print('%-14s %6d %10.4f %10.4f %8.1f %12.0f %12.0f %10d %10d' % (r['subject'], r['size'],
+            r['vm_secs'], r['native_secs'], r['slowdown'], r['instructions_per_sec'],
+            r['comparisons_per_sec'], r['peak_rss_kb'], r['trace_bytes']), flush=True)
+        if out:
+            out.writerow(r)
+    if failures:
+        sys.exit('%d measurement(s) failed' % len(failures))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+"""An on-disk cache of compiled code objects.
+
+Entries are marshalled code objects keyed by a hash of the file name and
+source and by the interpreter's cache tag, under $TRACKINGVM_CACHE
+(default ~/.cache/trackingvm).
+"""
+import builtins
+import contextlib
+import hashlib
+import importlib.machinery
+import marshal
+import os
+import sys
+
+def cache_dir():
+    return os.environ.get('TRACKINGVM_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'trackingvm')
+
+def cache_path(source, filename):
+    h = hashlib.sha256(os.fsencode(filename) + b'\0' + source).hexdigest()
+    return os.path.join(cache_dir(), '%s.%s.code' % (h, sys.implementation.cache_tag))
+
+def compile_source(source, filename):
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    path = cache_path(source, filename)
+    try:
+        with open(path, 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    code = builtins.compile(source, filename, 'exec', dont_inherit=True)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '%s.%d' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            marshal.dump(code, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return code
+
+def compile_file(filename):
+    with open(filename, 'rb') as f:
+        return compile_source(f.read(), filename)
+
+def compile(source, filename, mode, *args, **kwargs):
+    # A drop in for the builtin that only caches whole modules.
+    if mode != 'exec' or args or kwargs:
+        return builtins.compile(source, filename, mode, *args, **kwargs)
+    return compile_source(source, filename)
+
+class CachedLoader(importlib.machinery.SourceFileLoader):
+    def get_code(self, fullname):
+        return compile_file(self.get_filename(fullname))
+
+class CachedFinder:
+    """Finds source modules like PathFinder, but loads them through the cache."""
+    @classmethod
+    def find_spec(cls, name, path=None, target=None):
+        spec = importlib.machinery.PathFinder.find_spec(name, path, target)
+        if spec and type(spec.loader) is importlib.machinery.SourceFileLoader:
+            spec.loader = CachedLoader(spec.loader.name, spec.loader.path)
+        return spec
+
+@contextlib.contextmanager
+def installed(module):
+    """Route module's compile() calls and new imports through the cache."""
+    saved = vars(module).get('compile')
+    module.compile = compile
+    meta_path = sys.meta_path
+    meta_path.insert(meta_path.index(importlib.machinery.PathFinder), CachedFinder)
+    try:
+        yield
+    finally:
+        meta_path.remove(CachedFinder)
+        if saved is None:
+            del module.compile
+        else:
+            module.compile = saved
@@ -1,37 +1,125 @@
 import os.path
 import string
 import bytevm.sys as sys
+import sys as realsys
 import argparse
+import contextlib
+import json
 import logging
 import bytevm.execfile as bex
 import enum
 
 from pycore import dataparser as dp
+from . import cache, filters
+from .pipeline import JsonLines, Pipeline
+from .profile import Profiler
+from .snapshot import Snapshot
 from .vm import TrackerVM, Op
 from taintedstr import tstr
 
 def log(var, i=1):
     print(repr(var), file=sys.stderr, flush=True)
 
+def to_json(arg, ops, error=None):
+    cmps = [(o.x, Op(o.opnum).name, o.opA, o.opB, o.result, o.lineinfo) for o in ops]
+    record = {'input': arg, 'cmp': cmps}
+    if error is not None:
+        record['error'] = error
+    return json.dumps(record, default=repr)
+
+@contextlib.contextmanager
+def records_out():
+    """Point stdout (fd 1) at stderr, so that nothing the subject prints
+    gets there, and yield a file on the original stdout for the records."""
+    def flush():
+        sys.stdout.flush()
+        realsys.stdout.flush()
+    flush()
+    out = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+    try:
+        yield out
+    finally:
+        flush()
+        out.flush()
+        os.dup2(out.fileno(), 1)
+        out.close()
+
 import pudb
 brk =  pudb.set_trace
 
 class ExecFile(bex.ExecFile):
+    # In batch mode, the input strings the compiled subject is run against,
+    # and where their records go.
+    inputs = None
+    out = None
+    code_cache = True
+    profiler = None
+    snapshot = None
+    stream = None
+    # Only tainted comparisons make it to cmp_output; skip the rest at
+    # record time.
+    cmp_filters = (filters.tainted,)
+    trusted = ()
+    # Keep the operand objects (tstrs) in the traces, not only digests.
+    keep_operands = False
+    # Keep a replay log (branches and imports) for --save.
+    replay = False
+
+    def run_python_file(self, *args, **kwargs):
+        if not self.code_cache:
+            return super().run_python_file(*args, **kwargs)
+        with cache.installed(bex):
+            return super().run_python_file(*args, **kwargs)
 
     def exec_code_object(self, code, env):
+        if self.inputs is None:
+            return self.track(code, env)
+        with records_out() as self.out:
+            for arg in self.inputs:
+                sys.argv[1:] = [tstr(arg)]
+                self.track(code, dict(env))
+                self.emit(arg)
+
+    def emit(self, arg):
+        print(to_json(arg, self.cmp_output, self.error), file=self.out, flush=True)
+
+    def track(self, code, env):
         self.start_i = 0
-        vm = TrackerVM()
+        # What the subject raised (or exited with), if it did.
+        self.error = None
+        if self.snapshot:
+            self.snapshot.input = sys.argv[1]
+        vm = self.vm = TrackerVM(trace_ops=(), keep_operands=self.keep_operands,
+                profiler=self.profiler, snapshot=self.snapshot, cmp_filters=self.cmp_filters,
+                trusted=self.trusted, replay=self.replay)
+        # cmp_trace can be read (or listened to) in offset order while the
+        # subject runs, and summary looked up per offset; cmp_output is
+        # the final state.
+        self.cmp_trace = vm.cmp_trace
+        self.summary = vm.summary
         try:
             self.cmp_output = []
             log(">> %s" % sys.argv[1], 0)
-            v = vm.run_code(code, f_globals=env)
-            chars = [o for o in vm.cmp_trace if hasattr(o.opA, 'x')] # these are tstrs.
-            chars = sorted(chars, key=lambda x: x.opA.x())
-            for o in chars:
-                self.cmp_output.append(o)
+            pipeline = None
+            if self.stream:
+                pipeline = Pipeline([JsonLines(self.stream)])
+                pipeline.attach(vm.cmp_trace)
+            try:
+                v = vm.run_code(code, f_globals=env)
+            finally:
+                if pipeline:
+                    pipeline.close()
+            # TraceOps; the operands are digests unless keep_operands is
+            # set, and o.x is the input offset.
+            self.cmp_output.extend(vm.cmp_trace.tainted())
             return v
-        except Exception as e:
-            print(e)
+        except (Exception, SystemExit) as e:
+            # In batch mode an exit ends this input, not the batch.
+            if isinstance(e, SystemExit) and self.inputs is None:
+                raise
+            self.error = '%s: %s' % (type(e).__name__, e)
+            print(self.error, file=sys.stderr, flush=True)
 
     def cmdline(self, argv):
         parser = argparse.ArgumentParser(
@@ -46,6 +134,50 @@ class ExecFile(bex.ExecFile):
             '-v', '--verbose', dest='verbose', action='store_true',
             help="trace the execution of the bytecode.",
         )
+        parser.add_argument(
+            '-b', '--batch', dest='batch', metavar='FILE',
+            help="run prog once per line of FILE ('-' for stdin), printing one JSON trace per line; what prog prints goes to stderr.",
+        )
+        parser.add_argument(
+            '--no-cache', dest='code_cache', action='store_false',
+            help="compile the program and its imports without the code cache.",
+        )
+        parser.add_argument(
+            '--profile', dest='profile', metavar='PREFIX',
+            help="profile the VM, writing PREFIX.txt and PREFIX.folded (flame graph stacks).",
+        )
+        parser.add_argument(
+            '--sample', dest='sample', type=int, default=16,
+            help="time one in SAMPLE instructions when profiling.",
+        )
+        parser.add_argument(
+            '--fork-at', dest='fork_at', type=int, metavar='N',
+            help="at the first comparison on input offset N, also run each --suffix from there.",
+        )
+        parser.add_argument(
+            '--suffix', dest='suffixes', action='append', default=[],
+            help="an input suffix (from offset N) to resume with; may be repeated.",
+        )
+        parser.add_argument(
+            '--save', dest='save', metavar='FILE',
+            help="write the run's traces and replay log to FILE (see trackingvm.replay).",
+        )
+        parser.add_argument(
+            '--stream', dest='stream', metavar='FILE',
+            help="write tainted comparisons to FILE as JSON lines from a background thread while the program runs.",
+        )
+        parser.add_argument(
+            '--all-comparisons', dest='all_comparisons', action='store_true',
+            help="record untainted comparisons too, for --save; --stream only ever gets the tainted ones.",
+        )
+        parser.add_argument(
+            '--keep-operands', dest='keep_operands', action='store_true',
+            help="keep the compared objects themselves (tstrs) in cmp_output, not digests; uses more memory.",
+        )
+        parser.add_argument(
+            '--trust', dest='trusted', action='append', default=[], metavar='MODULE',
+            help="do not trace frames of MODULE or its submodules; may be repeated.",
+        )
         parser.add_argument(
             'prog',
             help="The program to run.",
@@ -59,4 +191,40 @@ class ExecFile(bex.ExecFile):
         level = logging.DEBUG if args.verbose else logging.WARNING
         logging.basicConfig(level=level)
 
+        self.code_cache = args.code_cache
+        self.trusted = args.trusted
+        self.keep_operands = args.keep_operands
+        self.replay = bool(args.save)
+        if args.all_comparisons:
+            self.cmp_filters = ()
+        if args.stream:
+            self.stream = open(args.stream, 'w')
+        if args.fork_at is not None:
+            # One checkpoint is taken per run, on the input given as argument.
+            if args.batch:
+                parser.error('--fork-at cannot be used with -b')
+            if not args.args:
+                parser.error('--fork-at needs the input as an argument')
+            self.snapshot = Snapshot(args.fork_at, args.suffixes)
+        if args.profile:
+            self.profiler = Profiler(args.sample)
+        if args.batch:
+            f = sys.stdin if args.batch == '-' else open(args.batch)
+            self.inputs = (line.rstrip('\n') for line in f)
         self.run_python_file(args.prog, [args.prog] + [tstr(i) for i in args.args])
+        if args.save:
+            self.vm.save_trace(args.save)
+        if self.snapshot:
+            prefix = args.args[0][:args.fork_at]
+            for suffix, trace in self.snapshot.results.items():
+                if trace is not None:
+                    print(to_json(prefix + suffix, trace.tainted(), self.snapshot.errors[suffix]),
+                          flush=True)
+                else:
+                    print('suffix %r: %s' % (suffix, self.snapshot.invalid[suffix]),
+                          file=sys.stderr, flush=True)
+        if self.profiler:
+            with open(args.profile + '.txt', 'w') as out:
+                self.profiler.report(out)
+            with open(args.profile + '.folded', 'w') as out:
+                self.profiler.write_collapsed(out)
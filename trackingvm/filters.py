@@ -0,0 +1,49 @@
+"""Record-time filters for the comparisons a TrackerVM traces.
+
+A filter is called as filter(opnum, opA, opB, frame) before a comparison
+is recorded; comparisons any filter rejects never reach the trace.
+"""
+from .trace import locations, taint_index
+
+def tainted(opnum, opA, opB, frame):
+    """Either operand carries input taint."""
+    return taint_index(opA) >= 0 or taint_index(opB) >= 0
+
+def opnums(*ops):
+    """The comparison is one of ops (Op members or opnums)."""
+    allowed = frozenset(getattr(op, 'value', op) for op in ops)
+    def opnum_in(opnum, opA, opB, frame):
+        return opnum in allowed
+    return opnum_in
+
+def codes(*allowed):
+    """The comparison is made in one of the given code objects, or in code
+    whose name or file name is among the given strings."""
+    objects = {c for c in allowed if not isinstance(c, str)}
+    names = {c for c in allowed if isinstance(c, str)}
+    def code_in(opnum, opA, opB, frame):
+        code = frame.f_code
+        return code in objects or code.co_name in names or code.co_filename in names
+    return code_in
+
+def lines(lo, hi, filename=None):
+    """The comparison is on a line in [lo, hi], optionally only in filename."""
+    def line_in(opnum, opA, opB, frame):
+        code = frame.f_code
+        if filename is not None and code.co_filename != filename:
+            return False
+        return lo <= locations(code)[frame.f_lasti - 1].line <= hi
+    return line_in
+
+def all_of(filters):
+    filters = list(filters)
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    def accept(opnum, opA, opB, frame):
+        for f in filters:
+            if not f(opnum, opA, opB, frame):
+                return False
+        return True
+    return accept
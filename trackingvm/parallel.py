@@ -0,0 +1,102 @@
+"""Run a subject over a corpus of inputs on a pool of worker processes.
+
+Each worker runs a chunk of inputs through a batch mode ExecFile (one
+TrackerVM per input) and sends back one bytes blob per chunk holding the
+length-prefixed CmpTrace encodings, each followed by the length-prefixed
+error the subject raised (empty if none). Results are yielded in input
+order.
+"""
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import os
+import struct
+import sys
+
+from .execfile import ExecFile, to_json
+from .trace import CmpTrace
+
+LENGTH = struct.Struct('<I')
+
+class Collector(ExecFile):
+    def __init__(self, inputs):
+        super().__init__()
+        self.inputs = inputs
+        self.traces = []
+
+    def emit(self, arg):
+        data = self.cmp_trace.tobytes()
+        error = (self.error or '').encode('utf-8', 'backslashreplace')
+        self.traces.append(LENGTH.pack(len(data)) + data + LENGTH.pack(len(error)) + error)
+
+def track_chunk(prog, chunk):
+    c = Collector(chunk)
+    c.run_python_file(prog, [prog])
+    return b''.join(c.traces)
+
+def decode(data):
+    i = 0
+    while i < len(data):
+        n, = LENGTH.unpack_from(data, i)
+        i += LENGTH.size
+        trace = CmpTrace.frombytes(data[i:i + n])
+        i += n
+        n, = LENGTH.unpack_from(data, i)
+        i += LENGTH.size
+        yield trace, data[i:i + n].decode('utf-8') or None
+        i += n
+
+def chunks(inputs, size):
+    it = iter(inputs)
+    return iter(lambda: list(itertools.islice(it, size)), [])
+
+def run(prog, inputs, jobs=None, chunksize=64):
+    """Yield (input, CmpTrace, error) for each input, in order; error is
+    None unless the subject raised."""
+    jobs = jobs or os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        # Keep a bounded window of chunks in flight so that a large corpus
+        # is not read (or its results held) all at once.
+        pending = collections.deque()
+        for chunk in chunks(inputs, chunksize):
+            pending.append((chunk, pool.submit(track_chunk, prog, chunk)))
+            if len(pending) >= 2 * jobs:
+                yield from done(pending.popleft())
+        while pending:
+            yield from done(pending.popleft())
+
+def done(entry):
+    chunk, future = entry
+    for arg, (trace, error) in zip(chunk, decode(future.result())):
+        yield arg, trace, error
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="trackingvm.parallel",
+        description="Track a program over many inputs in parallel.",
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help="number of worker processes (default: one per core).",
+    )
+    parser.add_argument(
+        '-c', '--chunksize', type=int, default=64,
+        help="inputs handed to a worker at a time.",
+    )
+    parser.add_argument(
+        'inputs',
+        help="file with one input per line ('-' for stdin).",
+    )
+    parser.add_argument(
+        'prog',
+        help="The program to run.",
+    )
+    args = parser.parse_args(argv)
+    f = sys.stdin if args.inputs == '-' else open(args.inputs)
+    inputs = (line.rstrip('\n') for line in f)
+    for arg, trace, error in run(args.prog, inputs, args.jobs, args.chunksize):
+        print(to_json(arg, trace.tainted(), error), flush=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,86 @@
+"""Consume tainted comparisons on a background thread while the VM runs.
+
+A Pipeline listens to a CmpTrace. The VM thread only appends (row, k) to
+the current batch; full batches go on a bounded queue, so a consumer that
+falls behind blocks the VM (backpressure) instead of letting batches pile
+up. The consumer thread turns each batch into TraceOp views and hands the
+list to every consumer.
+"""
+import collections
+import json
+import queue
+import threading
+
+from .trace import Op
+
+class Pipeline:
+    def __init__(self, consumers, batch=1024, depth=16):
+        self.consumers = list(consumers)
+        self.batch = batch
+        self.pending = []
+        self.queue = queue.Queue(depth)
+        self.error = None
+        self.trace = None
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+
+    def attach(self, trace):
+        self.trace = trace
+        trace.listeners.append(self.record)
+        self.thread.start()
+
+    def record(self, trace, row, k):
+        self.pending.append((row, k))
+        if len(self.pending) >= self.batch:
+            self.queue.put(self.pending)
+            self.pending = []
+
+    def close(self):
+        """Flush the last batch, wait for the consumers and re-raise their error."""
+        if self.trace is None:
+            return
+        self.trace.listeners.remove(self.record)
+        if self.pending:
+            self.queue.put(self.pending)
+            self.pending = []
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def drain(self):
+        for batch in iter(self.queue.get, None):
+            if self.error:
+                # keep draining so the VM never blocks on a dead consumer
+                continue
+            try:
+                ops = [self.trace.view(row, k) for row, k in batch]
+                for consume in self.consumers:
+                    consume(ops)
+            except Exception as e:
+                self.error = e
+
+def only(predicate, consume):
+    def filtered(ops):
+        ops = [o for o in ops if predicate(o)]
+        if ops:
+            consume(ops)
+    return filtered
+
+class Buckets:
+    """Comparisons grouped by taint index."""
+    def __init__(self):
+        self.buckets = collections.defaultdict(list)
+
+    def __call__(self, ops):
+        for o in ops:
+            self.buckets[o.x].append(o)
+
+class JsonLines:
+    """Writes one JSON line per comparison."""
+    def __init__(self, out):
+        self.out = out
+
+    def __call__(self, ops):
+        self.out.writelines(json.dumps([o.x, Op(o.opnum).name, o.opA, o.opB, o.result, o.lineinfo],
+            default=repr) + '\n' for o in ops)
+        self.out.flush()
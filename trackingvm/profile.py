@@ -0,0 +1,86 @@
+"""Instruction level profiling for TrackerVM.
+
+Every instruction is counted against its (opcode, code object, offset).
+Every `sample`-th instruction is also timed, from the moment it is
+dispatched to the moment the next instruction is, so nested calls are
+not charged to the CALL that made them. Its time is scaled by `sample`.
+Lines are resolved from offsets only when a report is made.
+"""
+import collections
+import time
+
+from .trace import line_number
+
+def where(code):
+    return '%s:%s:%d' % (code.co_filename, code.co_name, code.co_firstlineno)
+
+class Profiler:
+    def __init__(self, sample=16):
+        self.sample = sample
+        self.counts = collections.Counter()
+        self.times = collections.Counter()
+        self.stacks = collections.Counter()
+        self.tick = 0
+        self.pending = None
+
+    def install(self, vm):
+        dispatch = vm.dispatch
+        counts = self.counts
+        clock = time.perf_counter_ns
+        def profiled(byteName, arguments):
+            f = vm.frame
+            key = (byteName, f.f_code, f.f_lasti)
+            counts[key] += 1
+            if self.pending:
+                k, start = self.pending
+                self.times[k] += (clock() - start) * self.sample
+                self.pending = None
+            self.tick += 1
+            if self.tick == self.sample:
+                self.tick = 0
+                self.stacks[self.stack(vm, byteName)] += self.sample
+                self.pending = (key, clock())
+            return dispatch(byteName, arguments)
+        vm.dispatch = profiled
+
+    def stack(self, vm, byteName):
+        frames = []
+        f = vm.frame
+        while f is not None:
+            frames.append('%s:%s' % (f.f_code.co_filename, f.f_code.co_name))
+            f = f.f_back
+        frames.reverse()
+        frames.append(byteName)
+        return ';'.join(frames)
+
+    def totals(self, by):
+        counts, times = collections.Counter(), collections.Counter()
+        for key, n in self.counts.items():
+            counts[by(*key)] += n
+        for key, t in self.times.items():
+            times[by(*key)] += t
+        return counts, times
+
+    def by_opcode(self):
+        return self.totals(lambda name, code, offset: name)
+
+    def by_code(self):
+        return self.totals(lambda name, code, offset: where(code))
+
+    def by_line(self):
+        return self.totals(lambda name, code, offset:
+                '%s:%d' % (code.co_filename, line_number(code, offset - 1)))
+
+    def report(self, out, top=30):
+        for title, (counts, times) in (('opcode', self.by_opcode()),
+                ('code object', self.by_code()), ('line', self.by_line())):
+            print('%14s %12s  %s' % ('ns (est.)', 'count', title), file=out)
+            for k, _ in sorted(counts.items(), key=lambda kv: (-times[kv[0]], -kv[1]))[:top]:
+                print('%14d %12d  %s' % (times[k], counts[k], k), file=out)
+            print(file=out)
+
+    def write_collapsed(self, out):
+        # Brendan Gregg's collapsed stack format, weighted by sampled
+        # instruction counts.
+        for stack, n in sorted(self.stacks.items()):
+            print('%s %d' % (stack, n), file=out)
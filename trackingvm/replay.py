@@ -0,0 +1,144 @@
+"""Replay logs: re-query a tracked run without running the subject again.
+
+While recording, a ReplayLog notes the outcome of every conditional jump
+(its location and whether it was taken) and every import. It is saved
+alongside the comparison trace in the trace file. load() rebuilds a
+CmpTrace from a trace file, reading whole sections at once, and the
+command line filters and prints its comparisons:
+
+    python -m trackingvm.replay run.trace --op EQ --offset 0:10
+"""
+import argparse
+import array
+import dis
+import re
+import sys
+
+from .trace import CmpTrace, Op, Table, locations
+from .tracefile import CMP, TraceFile
+
+# Conditional jumps.
+BRANCHES = [name for name in dis.opmap
+        if 'JUMP' in name and ('IF_TRUE' in name or 'IF_FALSE' in name)]
+
+class ReplayLog:
+    def __init__(self):
+        self.locations = Table()
+        self.location = array.array('I')
+        self.taken = array.array('b')
+        self.imports = []
+
+    def install(self, vm):
+        for name in BRANCHES:
+            fn = getattr(vm, 'byte_%s' % name, None)
+            if fn:
+                setattr(vm, 'byte_%s' % name, self.branch(vm, fn))
+
+    def branch(self, vm, fn):
+        def byte_jump(*arguments):
+            # Testing the value may run subject code (and its branches), so
+            # let the VM do it and see whether the frame jumped.
+            f = vm.frame
+            lasti = f.f_lasti
+            r = fn(*arguments)
+            if not f.f_trusted:
+                self.location.append(self.locations.index(locations(f.f_code)[lasti - 1]))
+                self.taken.append(f.f_lasti != lasti)
+            return r
+        return byte_jump
+
+    def imported(self, name, module):
+        self.imports.append((name, getattr(module, '__name__', None)))
+
+def load(path):
+    """The CmpTrace, branches and imports saved in a trace file."""
+    with TraceFile(path) as tf:
+        t = CmpTrace()
+        strings = [tf.string(i) for i in range(tf.n_strings)]
+        t.operands.extend(strings)
+        t.lines = t.operands
+        data = tf.mm[tf.cmp_off:tf.cmp_off + tf.n_rows * CMP.size]
+        for i, (x, _, a, b, line, other, count, opnum, r) in enumerate(CMP.iter_unpack(data)):
+            t.x.append(x)
+            t.opA.append(a)
+            t.opB.append(b)
+            t.line.append(line)
+            t.count.append(count)
+            t.opnum.append(opnum)
+            t.result.append(r)
+            if r < 0:
+                t.results[i] = strings[other]
+            if x >= 0:
+                for k in range(count):
+                    t.bucket(x + k).append(i)
+        t.n = tf.n_cmp
+        branches = [tf.branch(i) for i in range(tf.n_branch)]
+        return t, branches, tf.imports
+
+def span(s):
+    lo, sep, hi = s.partition(':')
+    if not sep:
+        return int(lo), int(lo) + 1
+    return int(lo or 0), int(hi) if hi else sys.maxsize
+
+def line_of(lineinfo):
+    m = re.search(r':(\d+)$', str(lineinfo))
+    return int(m.group(1)) if m else -1
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="trackingvm.replay",
+        description="Query the comparisons of a saved run without re-running it.",
+    )
+    parser.add_argument(
+        '--all', dest='all', action='store_true',
+        help="include untainted comparisons, in execution order.",
+    )
+    parser.add_argument(
+        '--op', dest='ops', action='append', default=[],
+        help="only comparisons with this operator (EQ, IN, ...); may be repeated.",
+    )
+    parser.add_argument(
+        '--offset', dest='offset',
+        help="only input offsets X or LO:HI (HI exclusive).",
+    )
+    parser.add_argument(
+        '--lines', dest='lines',
+        help="only source lines N or LO:HI (HI exclusive).",
+    )
+    parser.add_argument(
+        '--branches', dest='branches', action='store_true',
+        help="print the branch outcomes instead.",
+    )
+    parser.add_argument(
+        '--imports', dest='imports', action='store_true',
+        help="print the imports instead.",
+    )
+    parser.add_argument(
+        'trace',
+        help="a trace file written with --save.",
+    )
+    args = parser.parse_args(argv)
+    trace, branches, imports = load(args.trace)
+    if args.imports:
+        for name, module in imports:
+            print(name, module)
+        return
+    if args.branches:
+        for loc, taken in branches:
+            print(loc, taken)
+        return
+    ops = {Op[o].value for o in args.ops}
+    offsets = span(args.offset) if args.offset else None
+    lines = span(args.lines) if args.lines else None
+    for o in (trace if args.all else trace.tainted()):
+        if ops and o.opnum not in ops:
+            continue
+        if offsets and not offsets[0] <= o.x < offsets[1]:
+            continue
+        if lines and not lines[0] <= line_of(o.lineinfo) < lines[1]:
+            continue
+        print(o)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,136 @@
+"""Resume a tracked run from a checkpoint with different input suffixes.
+
+A Snapshot fork()s the VM at the first comparison touching input offset
+`offset`. Each child swaps the input for its prefix + suffix and runs to
+the end, sending its comparison trace back over a pipe. The parent keeps
+the traces in `results`, keyed by suffix, and then carries on with its
+own input. If the subject raised in a child, `errors` holds what it
+raised for that suffix.
+
+The swap replaces references to the input held in dicts and lists (module
+and frame variables, object attributes, value stacks) and re-slices the
+compared operands. Values the subject derived from the input before the
+checkpoint (slices, stripped or lowered copies, references held in
+tuples) keep the old characters. So a child checks every tainted operand
+it compares against the new input, and at the first mismatch stops: the
+suffix's result is None and `invalid` holds the reason, rather than a
+trace of the old input under the new suffix.
+
+Nothing catches state that only counts the old input: a len() or a
+range() taken from it, or an iterator over it, is not swapped and
+compares no characters. A loop over one stops where the old input
+ends, so the trace of a longer suffix can be cut short without any
+error.
+"""
+import gc
+import os
+import struct
+import sys
+
+from .trace import CmpTrace, is_view, taint_index
+
+LENGTH = struct.Struct('<I')
+
+class Snapshot:
+    def __init__(self, offset, suffixes, input=None, jobs=None):
+        self.offset = offset
+        self.suffixes = list(suffixes)
+        self.input = input
+        self.jobs = jobs or os.cpu_count()
+        self.results = {}
+        self.errors = {}
+        self.invalid = {}
+        self.taken = False
+        self.child = None
+
+    def reached(self, *operands):
+        return not self.taken and max(taint_index(v) for v in operands) >= self.offset
+
+    def fork(self, vm):
+        self.taken = True
+        sys.stdout.flush()
+        sys.stderr.flush()
+        running = []
+        for suffix in self.suffixes:
+            if len(running) >= self.jobs:
+                self.reap(*running.pop(0))
+            r, w = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(r)
+                self.child = w
+                self.resume(vm, suffix)
+                return
+            os.close(w)
+            running.append((pid, r, suffix))
+        for entry in running:
+            self.reap(*entry)
+
+    def reap(self, pid, r, suffix):
+        with os.fdopen(r, 'rb') as f:
+            data = f.read()
+        os.waitpid(pid, 0)
+        tag, data = data[:1], data[1:]
+        if tag == b'T':
+            n, = LENGTH.unpack_from(data)
+            self.results[suffix] = CmpTrace.frombytes(data[LENGTH.size:LENGTH.size + n])
+            self.errors[suffix] = data[LENGTH.size + n:].decode('utf-8') or None
+        else:
+            self.results[suffix] = None
+            self.invalid[suffix] = data.decode('utf-8') if tag == b'E' else 'no trace'
+
+    def resume(self, vm, suffix):
+        old = self.input
+        prefix = str.__getitem__(old, slice(0, self.offset))
+        new = type(old)(prefix + suffix)
+        for ref in gc.get_referrers(old):
+            if isinstance(ref, dict):
+                for k, v in list(ref.items()):
+                    if v is old:
+                        ref[k] = new
+            elif isinstance(ref, list):
+                for i, v in enumerate(ref):
+                    if v is old:
+                        ref[i] = new
+        stack = vm.frame.stack
+        for i in (-2, -1):
+            x = taint_index(stack[i])
+            if x >= 0:
+                stack[i] = new[x:x + len(stack[i])]
+        self.input = new
+
+    def check(self, vm, *operands):
+        # In a child: every input character an operand was taken from must
+        # be the new input's.
+        new = self.input
+        for v in operands:
+            if taint_index(v) < 0:
+                continue
+            if is_view(v):
+                v = v.materialize()
+            for i in range(len(v)):
+                try:
+                    x = v.x(i)
+                except Exception:
+                    continue
+                if x < 0:
+                    continue
+                c = str.__getitem__(v, i)
+                if x >= len(new) or str.__getitem__(new, x) != c:
+                    self.finish(vm, 'compared %r from offset %d, which the new input does '
+                                'not have there; it was derived before the checkpoint' % (c, x))
+
+    def finish(self, vm, invalid=None, raised=None):
+        # Only called in a child: hand the trace and what the subject
+        # raised (or why there is no trace) back, and never return into
+        # the parent's code.
+        try:
+            with os.fdopen(self.child, 'wb') as f:
+                if invalid is None:
+                    data = vm.cmp_trace.tobytes()
+                    f.write(b'T' + LENGTH.pack(len(data)) + data
+                            + (raised or '').encode('utf-8', 'backslashreplace'))
+                else:
+                    f.write(b'E' + invalid.encode('utf-8', 'backslashreplace'))
+        finally:
+            os._exit(0)
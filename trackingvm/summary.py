@@ -0,0 +1,69 @@
+"""Per input offset summaries of what was compared, and the outcomes.
+
+For every offset a Summary keeps a small sorted array of distinct
+entries packed as (literal << 6) | (opnum << 2) | (result + 1), where
+literal is the id of operand B in the trace's operand table and result
+is 1, 0, or -1 for a non-bool result. It is filled by a CmpTrace
+listener as comparisons are recorded, and looked up by offset in O(1).
+"""
+import array
+import bisect
+
+from .trace import Op
+
+class Summary:
+    def __init__(self):
+        self.trace = None
+        self.offsets = []
+
+    def attach(self, trace):
+        self.trace = trace
+        trace.listeners.append(self.record)
+
+    def record(self, trace, row, k):
+        x = trace.x[row] + k
+        offsets = self.offsets
+        if x >= len(offsets):
+            offsets.extend(None for _ in range(x + 1 - len(offsets)))
+        entries = offsets[x]
+        if entries is None:
+            entries = offsets[x] = array.array('Q')
+        e = (trace.opB[row] << 6) | (trace.opnum[row] << 2) | (trace.result[row] + 1)
+        i = bisect.bisect_left(entries, e)
+        if i == len(entries) or entries[i] != e:
+            entries.insert(i, e)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def entries(self, x):
+        """The raw (literal id, opnum, result) entries of offset x."""
+        e = self.offsets[x] if 0 <= x < len(self.offsets) else None
+        return [(v >> 6, (v >> 2) & 0xf, (v & 0x3) - 1) for v in e] if e else []
+
+    def __getitem__(self, x):
+        """(literal, Op, result) for each distinct comparison made on offset x."""
+        values = self.trace.operands
+        return [(values[lit], Op(op), None if r < 0 else bool(r)) for lit, op, r in self.entries(x)]
+
+    def to_numpy(self):
+        """All entries as a structured array of (offset, literal, op, result) rows."""
+        import numpy
+        rows = [(x, lit, op, r) for x in range(len(self.offsets)) for lit, op, r in self.entries(x)]
+        return numpy.array(rows, dtype=[('offset', 'i8'), ('literal', 'u4'), ('op', 'u1'), ('result', 'i1')])
+
+    def bitmap(self, width=256):
+        """A dense (offsets, width) uint8 array over single character literals.
+
+        Cell [x, c] has bit 0 set if offset x was compared with chr(c) with
+        a false result and bit 1 if with a true one.
+        """
+        import numpy
+        values = self.trace.operands
+        m = numpy.zeros((len(self.offsets), width), dtype=numpy.uint8)
+        for x in range(len(self.offsets)):
+            for lit, op, r in self.entries(x):
+                v = values[lit]
+                if r >= 0 and isinstance(v, str) and len(v) == 1 and ord(v) < width:
+                    m[x, ord(v)] |= 1 << r
+        return m
@@ -0,0 +1,452 @@
+import array
+import bisect
+import dis
+import enum
+import itertools
+import marshal
+import weakref
+
+class Op(enum.Enum):
+    LT = 0
+    LE = enum.auto()
+    EQ = enum.auto()
+    NE = enum.auto()
+    GT = enum.auto()
+    GE = enum.auto()
+    IN = enum.auto()
+    NOT_IN = enum.auto()
+    IS = enum.auto()
+    IS_NOT = enum.auto()
+    ISSUBCLASS = enum.auto()
+
+class TraceOp:
+    """An immutable view of one recorded comparison.
+
+    opA and opB are digests of the operands (see digest()), plain values
+    rather than tstrs, unless the trace keeps operands. The input offset
+    of operand A is x; use it instead of opA.x().
+    """
+    __slots__ = ('opnum', 'opA', 'opB', 'lineinfo', 'x', 'result')
+
+    def __init__(self, opnum, oargs, lineinfo, x=-1, result=None):
+        setattr = object.__setattr__
+        setattr(self, 'opnum', opnum)
+        setattr(self, 'opA', oargs[0])
+        setattr(self, 'opB', oargs[1])
+        setattr(self, 'lineinfo', lineinfo)
+        setattr(self, 'x', x)
+        setattr(self, 'result', result)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TraceOp is immutable')
+
+    __delattr__ = __setattr__
+
+    @property
+    def oargs(self):
+        return [self.opA, self.opB]
+
+    def __repr__(self):
+        return "%s %s %s %s" % (Op(self.opnum).name, self.oargs, self.result, self.lineinfo)
+
+DIGEST_LEN = 32
+
+def is_view(v):
+    # A myio.StringView stands for base[start:stop] but is not a str. The
+    # VM may load myio as myio or as pycore.myio, so go by the name.
+    return type(v).__name__ == 'StringView'
+
+def digest(v):
+    # A small, hashable stand-in for an operand: short strings and scalars
+    # as they are, long strings truncated, small containers element-wise.
+    if v is None or isinstance(v, (bool, int, float)):
+        return v
+    if isinstance(v, str):
+        s = str.__getitem__(v, slice(0, DIGEST_LEN + 1))
+        return s if len(s) <= DIGEST_LEN else s[:DIGEST_LEN] + '...'
+    if is_view(v):
+        s = str.__getitem__(v.base, slice(v.start, min(v.stop, v.start + DIGEST_LEN + 1)))
+        return s if len(s) <= DIGEST_LEN else s[:DIGEST_LEN] + '...'
+    if isinstance(v, bytes):
+        s = bytes.__getitem__(v, slice(0, DIGEST_LEN + 1))
+        return s if len(s) <= DIGEST_LEN else s[:DIGEST_LEN] + b'...'
+    if isinstance(v, (tuple, list, set, frozenset)) and len(v) <= DIGEST_LEN:
+        items = [digest(i) for i in v]
+        return tuple(items) if isinstance(v, (tuple, list)) else frozenset(items)
+    return '<%s>' % type(v).__name__
+
+class Location:
+    """An interned (file, line) pair, rendered only when printed."""
+    __slots__ = ('filename', 'line')
+
+    def __init__(self, filename, line):
+        self.filename = filename
+        self.line = line
+
+    def __repr__(self):
+        return '%s:%d' % (self.filename, self.line)
+
+# Locations don't refer to their code object, so an entry goes away with
+# its code (workers load fresh code objects for every chunk).
+LOCATIONS = weakref.WeakKeyDictionary()
+
+def locations(code):
+    """The Location of every offset of code, built once per code object."""
+    try:
+        return LOCATIONS[code]
+    except KeyError:
+        pass
+    starts = [(o, l) for o, l in dis.findlinestarts(code) if l is not None]
+    interned = {}
+    table = []
+    line = code.co_firstlineno
+    for offset, next_line in starts + [(len(code.co_code), None)]:
+        if offset > len(table):
+            if line not in interned:
+                interned[line] = Location(code.co_filename, line)
+            table.extend(interned[line] for _ in range(offset - len(table)))
+        line = next_line
+    LOCATIONS[code] = table
+    return table
+
+def line_number(code, offset):
+    return locations(code)[offset].line
+
+def marshalable(v):
+    try:
+        marshal.dumps(v)
+        return v
+    except ValueError:
+        return repr(v)
+
+def is_char(v):
+    return isinstance(v, str) and len(v) == 1
+
+def taint_index(v):
+    # Only tstr operands (and views of them) carry an input offset.
+    if isinstance(v, str):
+        return v.x() if len(v) and hasattr(v, 'x') else -1
+    if is_view(v) and v.stop > v.start and hasattr(v.base, 'x'):
+        return v.base.x(v.start)
+    return -1
+
+class Table:
+    """Interns values, handing out a dense index per distinct value."""
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def index(self, v):
+        key = (type(v), v)
+        try:
+            return self.ids[key]
+        except KeyError:
+            i = self.ids[key] = len(self.values)
+        except TypeError:
+            # unhashable values are kept once per occurrence
+            i = len(self.values)
+        self.values.append(v)
+        return i
+
+    def extend(self, values):
+        for v in values:
+            try:
+                self.ids.setdefault((type(v), v), len(self.values))
+            except TypeError:
+                pass
+            self.values.append(v)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __len__(self):
+        return len(self.values)
+
+class CmpTrace:
+    """The comparisons of a run, stored as parallel columns.
+
+    Each row holds the opnum, the taint index of operand A (-1 when it is
+    not tainted), digests of the operands and the line info as indexes
+    into interned tables, the result (-1 when it was not a bool; those
+    are kept aside in `results`) and a count. Indexing or iterating
+    yields TraceOp views.
+
+    Only digests are kept by default. With `keep_operands` the operand
+    objects themselves are also held, and the views return them.
+
+    Loops that scan the input make runs of comparisons that differ only
+    in operand A, a character at consecutive offsets, with the same
+    opnum, operand B, line and result. With `fold` such a run is one row
+    whose count is its length and whose operand A is the string of the
+    characters compared; views of its comparisons are made on access.
+
+    Tainted comparisons are also bucketed by input offset as they are
+    recorded, so the trace can be read in offset order at any point of
+    the run, and `listeners` are called with (trace, row, k) for each of
+    them, k being the position within a folded row.
+    """
+    VERSION = 2
+    COLUMNS = ('opnum', 'x', 'opA', 'opB', 'line', 'result', 'count')
+
+    def __init__(self, keep_operands=False, fold=True):
+        self.opnum = array.array('b')
+        self.x = array.array('q')
+        self.opA = array.array('I')
+        self.opB = array.array('I')
+        self.line = array.array('I')
+        self.result = array.array('b')
+        self.count = array.array('I')
+        self.results = {}
+        self.operands = Table()
+        self.lines = Table()
+        self.keep_operands = keep_operands
+        self.kept = []
+        self.fold = fold and not keep_operands
+        self.run = None
+        self.n = 0
+        self.starts = None
+        self.index = []
+        self.listeners = []
+
+    def append(self, opnum, opA, opB, result, lineinfo):
+        r = 1 if result is True else 0 if result is False else -1
+        x = taint_index(opA)
+        a = digest(opA)
+        b = self.operands.index(digest(opB))
+        line = self.lines.index(lineinfo)
+        self.n += 1
+        self.starts = None
+        last = len(self.opnum) - 1
+        if (self.fold and x >= 0 and r >= 0 and last >= 0 and isinstance(a, str) and len(a) == 1
+                and self.x[last] >= 0 and self.x[last] + self.count[last] == x
+                and self.opB[last] == b and self.line[last] == line
+                and self.opnum[last] == opnum and self.result[last] == r
+                and (self.count[last] > 1 or is_char(self.operands[self.opA[last]]))):
+            if self.run is None:
+                # one character per comparison, so views can index it
+                self.run = list(self.operands[self.opA[last]])
+            self.run.append(a)
+            self.count[last] += 1
+            self.tainted_at(last, x - self.x[last])
+            return
+        self.close_run()
+        if r < 0:
+            self.results[last + 1] = result
+        self.result.append(r)
+        self.opnum.append(opnum)
+        self.x.append(x)
+        self.opA.append(self.operands.index(a))
+        self.opB.append(b)
+        self.line.append(line)
+        self.count.append(1)
+        if self.keep_operands:
+            self.kept.append((opA, opB))
+        if x >= 0:
+            self.tainted_at(last + 1, 0)
+
+    def tainted_at(self, row, k):
+        self.bucket(self.x[row] + k).append(row)
+        for fn in self.listeners:
+            fn(self, row, k)
+
+    def close_run(self):
+        # The characters of a growing run are collected in a list, and
+        # interned as one string once the run ends (or is read).
+        if self.run is not None:
+            self.opA[-1] = self.operands.index(''.join(self.run))
+            self.run = None
+
+    def bucket(self, x):
+        index = self.index
+        if x >= len(index):
+            index.extend(None for _ in range(x + 1 - len(index)))
+        if index[x] is None:
+            index[x] = array.array('I')
+        return index[x]
+
+    def tobytes(self):
+        """A compact, pickle-free encoding of the trace (kept operands are dropped)."""
+        self.close_run()
+        return marshal.dumps((self.VERSION,
+            tuple(getattr(self, c).tobytes() for c in self.COLUMNS),
+            {i: marshalable(digest(v)) for i, v in self.results.items()},
+            [marshalable(v) for v in self.operands.values],
+            [marshalable(v) for v in self.lines.values]))
+
+    @classmethod
+    def frombytes(cls, data):
+        version, columns, results, operands, lines = marshal.loads(data)
+        if version != cls.VERSION:
+            raise ValueError('unsupported trace encoding version %r' % version)
+        t = cls()
+        for c, b in zip(cls.COLUMNS, columns):
+            getattr(t, c).frombytes(b)
+        t.results = results
+        t.operands.extend(operands)
+        t.lines.extend(lines)
+        t.n = sum(t.count)
+        for i, x in enumerate(t.x):
+            if x >= 0:
+                for k in range(t.count[i]):
+                    t.bucket(x + k).append(i)
+        return t
+
+    def rows(self):
+        return len(self.opnum)
+
+    def view(self, row, k=0):
+        """The TraceOp of the k-th comparison folded into row."""
+        r = self.result[row]
+        if self.keep_operands:
+            oargs = self.kept[row]
+        else:
+            # Reading does not close a growing run, so views can be made
+            # from another thread while the VM is still recording.
+            run = self.run
+            if run is not None and row == len(self.opnum) - 1:
+                a = run[k]
+            elif self.count[row] > 1:
+                a = self.operands[self.opA[row]][k]
+            else:
+                a = self.operands[self.opA[row]]
+            oargs = (a, self.operands[self.opB[row]])
+        x = self.x[row]
+        return TraceOp(self.opnum[row], oargs, self.lines[self.line[row]], x + k if x >= 0 else x,
+                self.results[row] if r < 0 else bool(r))
+
+    def expand(self, row):
+        return [self.view(row, k) for k in range(self.count[row])]
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError('comparison index out of range')
+        if self.starts is None:
+            self.starts = array.array('Q', itertools.accumulate(self.count, initial=0))
+        row = bisect.bisect_right(self.starts, i) - 1
+        return self.view(row, i - self.starts[row])
+
+    def __iter__(self):
+        self.close_run()
+        return (self.view(row, k) for row in range(len(self.opnum)) for k in range(self.count[row]))
+
+    def at(self, x):
+        """The comparisons recorded so far for input offset x."""
+        self.close_run()
+        rows = self.index[x] if 0 <= x < len(self.index) else None
+        return [self.view(r, x - self.x[r]) for r in rows] if rows else []
+
+    def by_taint(self):
+        """(row, k) of the tainted comparisons, stably ordered by taint index."""
+        return [(r, x - self.x[r]) for x, rows in enumerate(self.index) if rows for r in rows]
+
+    def tainted(self):
+        """TraceOp views of the tainted comparisons in input offset order."""
+        self.close_run()
+        return (self.view(r, k) for r, k in self.by_taint())
+
+class ByteTrace:
+    """Fixed-size (opcode, arg, frame, line) records of the executed bytecode.
+
+    Records are kept in a ring of `capacity` entries, so memory stays the
+    same however long the run is. `retain` picks what survives once the
+    ring is full: 'last' keeps the most recent records, 'first' the
+    earliest. With `path`, the ring is a write buffer instead: that file is
+    truncated, every record is appended to it before it can be
+    overwritten, and only the most recent window is kept in memory.
+
+    The arg field indexes `names`, a table of the distinct instruction
+    arguments seen.
+    """
+    WIDTH = 4
+    FRAME_MASK = 0x7fffffff
+
+    def __init__(self, capacity=1 << 16, retain='last', path=None):
+        if retain not in ('last', 'first'):
+            raise ValueError('unknown retention policy %r' % retain)
+        if path and retain != 'last':
+            raise ValueError('a file backed trace always retains the last records')
+        self.capacity = capacity
+        self.retain = retain
+        self.records = array.array('i', bytes(4 * self.WIDTH * capacity))
+        self.count = 0
+        self.flushed = 0
+        self.args = {}
+        self.names = []
+        self.path = path
+        # A previous run's records index a different names table.
+        self.out = open(path, 'wb') if path else None
+
+    def intern(self, arguments):
+        try:
+            return self.args[arguments]
+        except KeyError:
+            pass
+        except TypeError:
+            arguments = repr(arguments)
+            if arguments in self.args:
+                return self.args[arguments]
+        i = self.args[arguments] = len(self.names)
+        self.names.append(arguments if isinstance(arguments, str) else repr(arguments))
+        return i
+
+    def append(self, opcode, arg, frame, line):
+        n = self.count
+        if n >= self.capacity:
+            if self.retain == 'first':
+                return
+            if self.out and n - self.flushed == self.capacity:
+                self.flush()
+        j = (n % self.capacity) * self.WIDTH
+        r = self.records
+        r[j] = opcode
+        r[j + 1] = arg
+        r[j + 2] = frame & self.FRAME_MASK
+        r[j + 3] = line
+        self.count = n + 1
+
+    def flush(self):
+        if not self.out:
+            return
+        pending = self.count - self.flushed
+        start = self.flushed % self.capacity
+        end = start + pending
+        W = self.WIDTH
+        if end <= self.capacity:
+            self.out.write(self.records[start * W:end * W].tobytes())
+        else:
+            self.out.write(self.records[start * W:].tobytes())
+            self.out.write(self.records[:(end - self.capacity) * W].tobytes())
+        self.flushed = self.count
+        self.out.flush()
+
+    def close(self):
+        if self.out:
+            self.flush()
+            self.out.close()
+            self.out = None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('byte trace index out of range')
+        if self.count > self.capacity and self.retain == 'last':
+            i += self.count
+        j = (i % self.capacity) * self.WIDTH
+        return tuple(self.records[j:j + self.WIDTH])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def render(self, record):
+        opcode, arg, frame, line = record
+        return (dis.opname[opcode], self.names[arg], frame, line)
@@ -0,0 +1,243 @@
+"""A binary file format for comparison and byte traces.
+
+    header      magic, version, record counts and section offsets
+    cmp         fixed-width comparison rows, in execution order
+    index       (row, k) of the tainted comparisons in taint order
+    byte        fixed-width ByteTrace records
+    branch      fixed-width (location, taken) records of a replay log
+    strings     offsets, then marshalled operands, line infos and names
+
+Records refer to operands, line infos, non-bool results, byte trace
+arguments and branch locations by their string table index, and the
+header names the string holding a replay log's imports. A comparison
+row may be a folded run (see CmpTrace) of `count` comparisons starting
+at comparison `start`; k is a position within it. TraceFile maps a file
+and reads records, strings and taint lookups on demand, so a trace
+never has to be loaded as a whole.
+"""
+import array
+import itertools
+import marshal
+import mmap
+import struct
+import sys
+
+from .trace import Table, TraceOp, marshalable
+
+MAGIC = b'TVMTRACE'
+VERSION = 3
+HEADER = struct.Struct('<8sHHI6Q5QQ')
+CMP = struct.Struct('<qQIIIIIbb2x')
+BYTE = struct.Struct('<4i')
+BRANCH = struct.Struct('<Ib3x')
+NONE = 0xffffffff
+
+# Every section is little-endian, like the struct records.
+
+def little(a):
+    if sys.byteorder == 'big':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+def write(path, cmp_trace=None, byte_trace=None, replay=None):
+    strings = Table()
+    def intern(v):
+        return strings.index(marshalable(v))
+    with open(path, 'wb') as f:
+        f.write(bytes(HEADER.size))
+        cmp_off = f.tell()
+        n_rows = n_cmp = 0
+        index = array.array('Q')
+        if cmp_trace is not None:
+            t = cmp_trace
+            t.close_run()
+            n_rows, n_cmp = t.rows(), len(t)
+            operands = [intern(v) for v in t.operands.values]
+            lines = [intern(v) for v in t.lines.values]
+            start = 0
+            for i in range(n_rows):
+                r = t.result[i]
+                other = intern(t.results[i]) if r < 0 else NONE
+                f.write(CMP.pack(t.x[i], start, operands[t.opA[i]], operands[t.opB[i]],
+                    lines[t.line[i]], other, t.count[i], t.opnum[i], r))
+                start += t.count[i]
+            index.extend(itertools.chain.from_iterable(t.by_taint()))
+        index_off = f.tell()
+        f.write(little(index))
+        byte_off = f.tell()
+        n_byte = write_bytes(f, byte_trace, intern) if byte_trace is not None else 0
+        branch_off = f.tell()
+        n_branch, imports = 0, NONE
+        if replay is not None:
+            where = [intern(v) for v in replay.locations.values]
+            for loc, taken in zip(replay.location, replay.taken):
+                f.write(BRANCH.pack(where[loc], taken))
+            n_branch = len(replay.taken)
+            imports = intern(replay.imports)
+        strings_off = f.tell()
+        blobs = [marshal.dumps(v) for v in strings.values]
+        offsets = array.array('Q', [0])
+        for b in blobs:
+            offsets.append(offsets[-1] + len(b))
+        f.write(little(offsets))
+        for b in blobs:
+            f.write(b)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0, n_rows, n_cmp, len(index) // 2, n_byte, n_branch,
+            len(blobs), cmp_off, index_off, byte_off, branch_off, strings_off, imports))
+
+def write_bytes(f, trace, intern):
+    names = [intern(n) for n in trace.names]
+    n = 0
+    for records in chunks(trace):
+        for j in range(1, len(records), trace.WIDTH):
+            records[j] = names[records[j]]
+        f.write(little(records))
+        n += len(records) // trace.WIDTH
+    return n
+
+def chunks(trace, size=1 << 16):
+    if not trace.path:
+        yield array.array('i', itertools.chain.from_iterable(trace))
+        return
+    # Every record was streamed to the trace's own file; read it back.
+    trace.flush()
+    with open(trace.path, 'rb') as src:
+        for data in iter(lambda: src.read(size * BYTE.size), b''):
+            records = array.array('i')
+            records.frombytes(data)
+            yield records
+
+class TraceFile:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, _, self.n_rows, self.n_cmp, self.n_index, self.n_byte, self.n_branch,
+            self.n_strings, self.cmp_off, self.index_off, self.byte_off, self.branch_off,
+            self.strings_off, self.imports_id) = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError('%s is not a trace file' % path)
+        if version != VERSION:
+            raise ValueError('unsupported trace file version %d' % version)
+        self.index = self.words(self.index_off, 2 * self.n_index)
+        n = self.n_strings + 1
+        self.offsets = self.words(self.strings_off, n)
+        self.blobs = self.strings_off + 8 * n
+        self.cache = {}
+
+    def words(self, offset, n):
+        # n little-endian 8-byte words, mapped where the host agrees
+        view = memoryview(self.mm)[offset:offset + 8 * n].cast('Q')
+        if sys.byteorder == 'little':
+            return view
+        words = array.array('Q', view)
+        view.release()
+        words.byteswap()
+        return words
+
+    def close(self):
+        for words in (self.index, self.offsets):
+            if isinstance(words, memoryview):
+                words.release()
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, i):
+        try:
+            return self.cache[i]
+        except KeyError:
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            v = self.cache[i] = marshal.loads(self.mm[self.blobs + lo:self.blobs + hi])
+            return v
+
+    def record(self, row):
+        """The raw (x, start, opA, opB, line, other, count, opnum, result) of a row."""
+        if not 0 <= row < self.n_rows:
+            raise IndexError('comparison row out of range')
+        return CMP.unpack_from(self.mm, self.cmp_off + row * CMP.size)
+
+    def view(self, row, k=0):
+        x, _, a, b, line, other, count, opnum, r = self.record(row)
+        a = self.string(a)
+        if count > 1:
+            a = a[k]
+        result = self.string(other) if r < 0 else bool(r)
+        return TraceOp(opnum, (a, self.string(b)), self.string(line), x + k if x >= 0 else x, result)
+
+    def expand(self, row):
+        return [self.view(row, k) for k in range(self.record(row)[6])]
+
+    def __len__(self):
+        return self.n_cmp
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n_cmp
+        if not 0 <= i < self.n_cmp:
+            raise IndexError('comparison index out of range')
+        lo, hi = 0, self.n_rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.record(mid)[1] <= i:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self.view(lo - 1, i - self.record(lo - 1)[1])
+
+    def __iter__(self):
+        return (v for row in range(self.n_rows) for v in self.expand(row))
+
+    def entry(self, j):
+        row, k = self.index[2 * j], self.index[2 * j + 1]
+        return row, k, self.record(row)[0] + k
+
+    def taint_range(self, x):
+        # The index is ordered by taint index; bisect it for x.
+        lo, hi = 0, self.n_index
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[2] < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        start, hi = lo, self.n_index
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[2] <= x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return start, lo
+
+    def at(self, x):
+        """The comparisons on input offset x."""
+        start, stop = self.taint_range(x)
+        return [self.view(*self.entry(j)[:2]) for j in range(start, stop)]
+
+    def tainted(self):
+        return (self.view(*self.entry(j)[:2]) for j in range(self.n_index))
+
+    def byte(self, i):
+        """Byte trace record i as (opcode, arg, frame, line), arg resolved."""
+        if not 0 <= i < self.n_byte:
+            raise IndexError('byte trace index out of range')
+        opcode, arg, frame, line = BYTE.unpack_from(self.mm, self.byte_off + i * BYTE.size)
+        return (opcode, self.string(arg), frame, line)
+
+    def branch(self, i):
+        """Branch record i of the replay log as (location, taken)."""
+        if not 0 <= i < self.n_branch:
+            raise IndexError('branch index out of range')
+        loc, taken = BRANCH.unpack_from(self.mm, self.branch_off + i * BRANCH.size)
+        return (self.string(loc), bool(taken))
+
+    @property
+    def imports(self):
+        """The (name, module) imports of the replay log."""
+        return self.string(self.imports_id) if self.imports_id != NONE else []
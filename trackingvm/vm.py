@@ -1,5 +1,11 @@
 import bytevm.pyvm2 as pvm
-import enum
+import dis
+import itertools
+
+from . import filters, tracefile
+from .replay import ReplayLog
+from .summary import Summary
+from .trace import ByteTrace, CmpTrace, Op, TraceOp, locations
 
 
 def brk(v=True):
@@ -7,50 +13,139 @@ def brk(v=True):
     import pudb
     pudb.set_trace()
 
-class Op(enum.Enum):
-    LT = 0
-    LE = enum.auto()
-    EQ = enum.auto()
-    NE = enum.auto()
-    GT = enum.auto()
-    GE = enum.auto()
-    IN = enum.auto()
-    NOT_IN = enum.auto()
-    IS = enum.auto()
-    IS_NOT = enum.auto()
-    ISSUBCLASS = enum.auto()
-
-class TraceOp:
-    def __init__(self, opnum, oargs, lineinfo):
-        self.__dict__.update(locals())
-        del self.__dict__['self']
-        self.opA, self.opB = oargs
-        self._r = None
-
-    def __repr__(self):
-        if not self._r:
-            self.result = pvm.VirtualMachine.COMPARE_OPERATORS[self.opnum](self.opA, self.opB)
-            self._r = "%s %s %s %s" % (Op(self.opnum).name, self.oargs, self.result, self.lineinfo)
-        return self._r
+def traced_opcodes(policy):
+    # None traces everything; otherwise a mix of opcode names and
+    # predicates over opcode names.
+    if policy is None:
+        return set(dis.opmap)
+    names = set()
+    for p in policy:
+        if callable(p):
+            names.update(n for n in dis.opmap if p(n))
+        elif p in dis.opmap:
+            names.add(p)
+        else:
+            raise ValueError('unknown opcode %r' % p)
+    return names
+
+OPERATORS = {'UNARY_': 'unaryOperator', 'BINARY_': 'binaryOperator', 'INPLACE_': 'inplaceOperator'}
 
 class TrackerVM(pvm.VirtualMachine):
-    def __init__(self):
-        self.cmp_trace = []
-        self.cmp_trace = []
-        self.byte_trace = []
+    # Modules imported by the subject are replaced by these instrumented
+    # versions, given as module names or module objects. Names are
+    # imported (through the VM) the first time the subject asks for them.
+    substitutes = {'io': 'myio', 're': 'rxpy.re'}
+
+    def __init__(self, byte_trace=None, trace_ops=None, keep_operands=False, profiler=None,
+            snapshot=None, cmp_filters=(), trusted=(), replay=False):
+        self.cmp_trace = CmpTrace(keep_operands)
+        # Frames of trusted modules (and their submodules) run without any
+        # tracing; taint still flows through the values they return.
+        self.trusted = tuple(trusted)
+        self.trusted_names = {}
+        self.cmp_filter = filters.all_of(cmp_filters)
+        self.summary = Summary()
+        self.summary.attach(self.cmp_trace)
+        self.snapshot = snapshot
+        self.frame_ids = itertools.count()
         super().__init__()
+        self.trace_ops = traced_opcodes(trace_ops)
+        # Without traced opcodes there is nothing to put in a ring.
+        if byte_trace is None and self.trace_ops:
+            byte_trace = ByteTrace()
+        self.byte_trace = byte_trace
+        self.install_tracers()
+        self.replay = ReplayLog() if replay else None
+        if self.replay:
+            self.replay.install(self)
+        if profiler:
+            profiler.install(self)
+        self.replacements = dict(self.substitutes)
+        # The replacements resolved so far.
+        self.modules = {}
+
+    def substitute(self, name, replacement):
+        self.replacements[name] = replacement
+        self.modules.pop(name, None)
+
+    def install_tracers(self):
+        # The dispatch table is built once: traced opcodes get a recording
+        # handler shadowing the class one, the rest dispatch to bytevm
+        # directly.
+        operators = {}
+        for name in self.trace_ops:
+            prefix = next((p for p in OPERATORS if name.startswith(p)), None)
+            if prefix:
+                operators.setdefault(prefix, set()).add(name[len(prefix):])
+                continue
+            fn = getattr(self, 'byte_%s' % name, None)
+            if fn:
+                setattr(self, 'byte_%s' % name, self.traced(dis.opmap[name], fn))
+        for prefix, ops in operators.items():
+            method = OPERATORS[prefix]
+            setattr(self, method, self.traced_operator(prefix, ops, getattr(self, method)))
+
+    def traced(self, opcode, fn):
+        def byte_op(*arguments):
+            f, t = self.frame, self.byte_trace
+            if not f.f_trusted:
+                t.append(opcode, t.intern(arguments), f.f_id, locations(f.f_code)[f.f_lasti - 1].line)
+            return fn(*arguments)
+        return byte_op
+
+    def traced_operator(self, prefix, ops, fn):
+        opcodes = {op: dis.opmap[prefix + op] for op in ops}
+        def operator(op):
+            f, t = self.frame, self.byte_trace
+            if op in opcodes and not f.f_trusted:
+                t.append(opcodes[op], t.intern(()), f.f_id,
+                        locations(f.f_code)[f.f_lasti - 1].line)
+            return fn(op)
+        return operator
+
+    def run_code(self, *args, **kwargs):
+        raised = None
+        try:
+            return super().run_code(*args, **kwargs)
+        except BaseException as e:
+            raised = '%s: %s' % (type(e).__name__, e)
+            raise
+        finally:
+            if self.byte_trace is not None:
+                self.byte_trace.flush()
+            if self.snapshot and self.snapshot.child is not None:
+                self.snapshot.finish(self, raised=raised)
+
+    def make_frame(self, *args, **kwargs):
+        frame = super().make_frame(*args, **kwargs)
+        frame.f_id = next(self.frame_ids)
+        frame.f_trusted = self.is_trusted(frame.f_globals.get('__name__', ''))
+        return frame
+
+    def is_trusted(self, name):
+        try:
+            return self.trusted_names[name]
+        except KeyError:
+            t = self.trusted_names[name] = any(name == m or name.startswith(m + '.') for m in self.trusted)
+            return t
 
     def byte_COMPARE_OP(self, opnum):
-        # Get the comparions. The filtering can be done later if needed.
+        # Get the comparions. Filters reject them before anything is recorded.
         opA, opB = self.frame.stack[-2:]
-        self.cmp_trace.append(TraceOp(opnum, [opA, opB], self.w()))
+        if self.snapshot:
+            if self.snapshot.child is not None:
+                self.snapshot.check(self, opA, opB)
+            elif self.snapshot.reached(opA, opB):
+                self.snapshot.fork(self)
+                opA, opB = self.frame.stack[-2:]
+        f = self.frame
+        if f.f_trusted or self.cmp_filter and not self.cmp_filter(opnum, opA, opB, f):
+            return super().byte_COMPARE_OP(opnum)
+        # f_lasti is already past the instruction; any offset inside it
+        # has the same location.
+        lineinfo = locations(f.f_code)[f.f_lasti - 1]
         super().byte_COMPARE_OP(opnum)
-
-    def byte_LOAD_ATTR(self, name):
-        super().byte_LOAD_ATTR(name)
-
-    def byte_LOAD_GLOBAL(self, name):
-        super().byte_LOAD_GLOBAL(name)
+        self.cmp_trace.append(opnum, opA, opB, self.frame.stack[-1], lineinfo)
 
     def byte_LOAD_NAME(self, name):
         if name == 'brk':
@@ -59,25 +154,26 @@ class TrackerVM(pvm.VirtualMachine):
         super().byte_LOAD_NAME(name)
 
     def byte_IMPORT_NAME(self, name):
-        if name == 'io':
-            super().byte_IMPORT_NAME('myio')
-            r = self.frame.stack[-1]
-            r.__name__ == 'io'
-        elif name == 're':
-            super().byte_IMPORT_NAME('rxpy.re')
-            r = self.frame.stack[-1]
-            r.__name__ == 're'
-        else:
+        replacement = self.replacements.get(name)
+        if replacement is None:
             super().byte_IMPORT_NAME(name)
-
-    def call_function(self, arg, args, kwargs):
-        return super().call_function(arg, args, kwargs)
-
-    def parse_byte_and_args(self):
-        byteName, arguments, offset = super().parse_byte_and_args()
-        self.byte_trace.append((byteName, arguments, self.frame.stack))
-        return (byteName, arguments, offset)
-
+        elif name in self.modules or not isinstance(replacement, str):
+            self.popn(2) # level, fromlist
+            self.push(self.modules.setdefault(name, replacement))
+        else:
+            super().byte_IMPORT_NAME(replacement)
+            module = self.pop()
+            # Without a fromlist, a dotted import yields the top package.
+            if getattr(module, '__name__', None) != replacement:
+                for part in replacement.split('.')[1:]:
+                    module = getattr(module, part)
+            self.modules[name] = module
+            self.push(module)
+        if self.replay:
+            self.replay.imported(name, self.frame.stack[-1])
 
     def get_trace(self):
         return self.cmp_trace
+
+    def save_trace(self, path):
+        tracefile.write(path, self.cmp_trace, self.byte_trace, self.replay)